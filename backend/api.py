@@ -0,0 +1,51 @@
+# api.py
+"""
+Punto de entrada del proceso API (solo Flask + Socket.IO).
+- No importa moviepy / yt_dlp / openpyxl / openai / mysql.connector al arrancar
+- Mide el tiempo de importación de app.py contra API_IMPORT_BUDGET_MS
+- Con PIPELINE_JOB_QUEUE el procesamiento lo hacen los workers (worker.py) y los resultados
+  que guardan llegan a este nodo por la réplica del almacén (ver start_results_replication)
+
+Uso:
+    python api.py                 # servidor API
+    python api.py --check-budget  # solo mide el arranque; exit 1 si se excede el presupuesto
+"""
+
+import os
+import sys
+import time
+
+API_IMPORT_BUDGET_MS = float(os.getenv("API_IMPORT_BUDGET_MS", "1500"))
+
+_t0 = time.perf_counter()
+import app as backend  # noqa: E402
+IMPORT_MS = (time.perf_counter() - _t0) * 1000
+
+
+def check_import_budget():
+    """Devuelve True si el arranque cumple el presupuesto y no cargó dependencias pesadas."""
+    loaded = [name for name in backend.HEAVY_MODULES if name in sys.modules]
+    ok = IMPORT_MS <= API_IMPORT_BUDGET_MS and not loaded
+    log = backend.logger.info if ok else backend.logger.warning
+    log(f"Import de app.py: {IMPORT_MS:.0f} ms (presupuesto {API_IMPORT_BUDGET_MS:.0f} ms)"
+        + (f"; dependencias pesadas cargadas: {', '.join(loaded)}" if loaded else ""))
+    return ok
+
+
+if __name__ == "__main__":
+    ok = check_import_budget()
+    if "--check-budget" in sys.argv:
+        sys.exit(0 if ok else 1)
+
+    if not backend.PIPELINE_JOB_QUEUE:
+        backend.logger.warning("PIPELINE_JOB_QUEUE no configurada: el pipeline se ejecutará en este proceso.")
+        # Sin workers la pre-ingesta (PREINGEST_ENABLED) también corre aquí
+        backend.start_preingest_scheduler()
+    else:
+        if not backend.start_results_replication():
+            sys.exit(1)
+        if backend.PREINGEST_ENABLED:
+            backend.logger.info("PREINGEST_ENABLED: la pre-ingesta la sondean los workers (worker.py), no este proceso.")
+
+    backend.logger.info(f"Starting API-only Flask + SocketIO server on localhost:{backend.PORT}")
+    backend.socketio.run(backend.app, host="localhost", port=backend.PORT)
@@ -17,6 +17,18 @@ import tempfile
 import re
 import math
 import shutil
+import gzip
+import base64
+import uuid
+import types
+import hashlib
+import sqlite3
+import threading
+import tracemalloc
+from collections import deque
+from concurrent.futures import Future
+from contextlib import closing, contextmanager
+from functools import wraps
 
 from datetime import datetime, timedelta
 from urllib.request import urlretrieve
@@ -24,29 +36,23 @@ from urllib.request import urlretrieve
 # import eventlet
 # eventlet.monkey_patch()
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
 from flask_cors import CORS
-from flask_socketio import SocketIO, emit, disconnect
+from flask_socketio import SocketIO, emit, disconnect, join_room, leave_room
 import requests
-import mysql.connector
 import pytz
 
-# Multimedia / audio libs (asegúrate de tenerlas instaladas)
-from moviepy.editor import VideoFileClip
-from yt_dlp import YoutubeDL, utils as ytdlp_utils
-import openpyxl
+import media_pool
 
-# OpenAI client
-try:
-    from openai import OpenAI
-except Exception:
-    OpenAI = None
+# Las dependencias pesadas (moviepy, yt_dlp, openpyxl, openai, mysql.connector, Clerk SDK)
+# se importan en su primer uso para que el proceso API arranque rápido (ver api.py / worker.py).
+HEAVY_MODULES = ('moviepy', 'yt_dlp', 'openpyxl', 'openai', 'mysql.connector', 'clerk_backend_sdk')
 
-# Optional: Clerk server SDK (if installed)
+# Optional: PyJWT para verificar localmente los JWT de sesión de Clerk
 try:
-    from clerk_backend_sdk import Clerk
+    import jwt
 except Exception:
-    Clerk = None
+    jwt = None
 
 # Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', handlers=[logging.StreamHandler(sys.stdout)])
@@ -68,27 +74,133 @@ MYSQL_USER = os.getenv("MYSQL_USER", "user")
 MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD", "")
 MYSQL_DATABASE = os.getenv("MYSQL_DATABASE", "notiexpress_dev")
 CLERK_SECRET_KEY = os.getenv("CLERK_SECRET_KEY")
+# Verificación local de JWT: JWKS de Clerk (o un servidor de claves local para pruebas)
+CLERK_JWKS_URL = os.getenv("CLERK_JWKS_URL")
+CLERK_JWKS_TTL = int(os.getenv("CLERK_JWKS_TTL", "3600"))
+CLERK_AUTHORIZED_PARTIES = [p.strip() for p in os.getenv("CLERK_AUTHORIZED_PARTIES", "").split(",") if p.strip()]
+VERIFIED_TOKEN_TTL = int(os.getenv("VERIFIED_TOKEN_TTL", "60"))
+AUTH_REQUIRED = bool(CLERK_SECRET_KEY or CLERK_JWKS_URL)
 API_HOST = os.getenv("API_HOST", "http://localhost:5000")
+PORT = int(os.getenv("PORT", "5000"))
 
-if OPENAI_API_KEY and OpenAI is not None:
-    client = OpenAI(api_key=OPENAI_API_KEY)
-else:
-    client = None
-    logger.warning("OpenAI client no inicializado. Define OPENAI_API_KEY y asegúrate de tener openai>=... instalado si usarás GPT features.")
+# Escalado multi-proceso: cola de mensajes compartida por Socket.IO (p.ej. redis://localhost:6379/0)
+# y cola de trabajos para workers separados (ver worker.py). Sin definir => todo en un solo proceso.
+SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE")
+PIPELINE_JOB_QUEUE = os.getenv("PIPELINE_JOB_QUEUE")
+PIPELINE_JOB_QUEUE_KEY = os.getenv("PIPELINE_JOB_QUEUE_KEY", "notiexpress:pipeline_jobs")
 
-if CLERK_SECRET_KEY and Clerk is not None:
-    clerk = Clerk(api_key=CLERK_SECRET_KEY)
-else:
-    clerk = None
-    if CLERK_SECRET_KEY:
-        logger.warning("CLERK_SECRET_KEY está definida pero no se encontró el paquete 'clerk'. La verificación de token fallará si no instalas clerk-sdk.")
-    else:
-        logger.info("CLERK no configurado. El servidor permitirá conexiones sin verificar (útil para pruebas locales).")
+if not OPENAI_API_KEY:
+    logger.warning("OpenAI client no inicializado. Define OPENAI_API_KEY y asegúrate de tener openai>=... instalado si usarás GPT features.")
+if not AUTH_REQUIRED:
+    logger.info("CLERK no configurado. El servidor permitirá conexiones sin verificar (útil para pruebas locales).")
+
+_lazy_lock = threading.Lock()
+_openai_client = None
+_openai_loaded = False
+_clerk = None
+_clerk_loaded = False
+
+def get_openai_client():
+    """Cliente OpenAI creado en el primer uso; None si no hay API key o falta el paquete."""
+    global _openai_client, _openai_loaded
+    if _openai_loaded:
+        return _openai_client
+    with _lazy_lock:
+        if not _openai_loaded:
+            if OPENAI_API_KEY:
+                try:
+                    from openai import OpenAI
+                    _openai_client = OpenAI(api_key=OPENAI_API_KEY)
+                except Exception as e:
+                    logger.warning(f"OpenAI client no inicializado: {e}")
+            _openai_loaded = True
+    return _openai_client
+
+def get_clerk():
+    """Cliente del SDK de Clerk creado en el primer uso; None si no está configurado."""
+    global _clerk, _clerk_loaded
+    if _clerk_loaded:
+        return _clerk
+    with _lazy_lock:
+        if not _clerk_loaded:
+            if CLERK_SECRET_KEY:
+                try:
+                    from clerk_backend_sdk import Clerk
+                    _clerk = Clerk(api_key=CLERK_SECRET_KEY)
+                except Exception:
+                    logger.warning("CLERK_SECRET_KEY está definida pero no se encontró el paquete 'clerk'. La verificación de token fallará si no instalas clerk-sdk.")
+            _clerk_loaded = True
+    return _clerk
+
+def preload_pipeline_dependencies():
+    """Importa por adelantado las dependencias del pipeline (para workers de larga vida)."""
+    import importlib
+    for name in HEAVY_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            logger.warning(f"No se pudo precargar {name}: {e}")
+    get_openai_client()
 
 # Directorio de descargas temporales
 DOWNLOAD_FOLDER = os.path.join(os.getcwd(), "downloads")
 os.makedirs(DOWNLOAD_FOLDER, exist_ok=True)
 
+# Almacén de resultados (transcripción completa + análisis) y modo de entrega compacto.
+# Cada nodo tiene su propio SQLite; con PIPELINE_JOB_QUEUE cada escritura se publica en un
+# stream de Redis y todos los procesos la aplican a su copia (ver start_results_replication).
+# RESULTS_LOG_MAXLEN: entradas que conserva el stream; un nodo que quede más atrás debe
+# arrancar desde una copia de results.db de otro nodo.
+RESULTS_DB_PATH = os.getenv("RESULTS_DB_PATH", os.path.join(os.getcwd(), "results.db"))
+RESULTS_LOG_KEY = os.getenv("RESULTS_LOG_KEY", "notiexpress:results_log")
+RESULTS_LOG_MAXLEN = int(os.getenv("RESULTS_LOG_MAXLEN", "20000"))
+COMPACT_RESULTS = os.getenv("COMPACT_RESULTS", "false").lower() in ("1", "true", "yes")
+TRANSCRIPT_PAGE_SIZE = int(os.getenv("TRANSCRIPT_PAGE_SIZE", "20000"))  # caracteres por página
+
+# Planificación de trabajos: hilos de pipeline, tope por usuario, carriles con peso y
+# slots reservados para trabajos interactivos (batch/pre-ingesta solo usan capacidad libre)
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "4"))
+PIPELINE_MAX_PER_USER = int(os.getenv("PIPELINE_MAX_PER_USER", "2"))
+PIPELINE_RESERVED_INTERACTIVE = int(os.getenv("PIPELINE_RESERVED_INTERACTIVE", "1"))
+PIPELINE_LANE_WEIGHTS = {
+    'interactive': float(os.getenv("PIPELINE_WEIGHT_INTERACTIVE", "8")),
+    'batch': float(os.getenv("PIPELINE_WEIGHT_BATCH", "2")),
+    'preingest': float(os.getenv("PIPELINE_WEIGHT_PREINGEST", "1")),
+}
+
+# Alertas por correo de coincidencias de palabras clave (desactivadas si no hay SMTP_HOST).
+# Para pruebas locales: python -m aiosmtpd -n -l localhost:1025 y SMTP_PORT=1025 SMTP_STARTTLS=false
+SMTP_HOST = os.getenv("SMTP_HOST")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() in ("1", "true", "yes")
+ALERT_FROM = os.getenv("ALERT_FROM", SMTP_USER or "alertas@localhost")
+ALERT_BATCH_WINDOW = float(os.getenv("ALERT_BATCH_WINDOW", "60"))    # segundos que se agrupan por destinatario
+ALERT_MAX_BATCH = int(os.getenv("ALERT_MAX_BATCH", "50"))            # envía antes si se llega a este tamaño
+ALERT_SMTP_IDLE = float(os.getenv("ALERT_SMTP_IDLE", "120"))         # cierra la conexión SMTP tras este tiempo sin uso
+
+# Pre-procesamiento en segundo plano de pautas nuevas (tv/radio)
+PREINGEST_ENABLED = os.getenv("PREINGEST_ENABLED", "false").lower() in ("1", "true", "yes")
+PREINGEST_INTERVAL = int(os.getenv("PREINGEST_INTERVAL", "300"))          # segundos entre sondeos
+PREINGEST_LOOKBACK_HOURS = float(os.getenv("PREINGEST_LOOKBACK_HOURS", "6"))  # ignora pautas más antiguas
+PREINGEST_MAX_PER_CYCLE = int(os.getenv("PREINGEST_MAX_PER_CYCLE", "10"))  # por tipo y por sondeo
+PREINGEST_DELAY = float(os.getenv("PREINGEST_DELAY", "5"))                # pausa entre pautas
+
+# Pool de procesos para conversión de medios (moviepy / ffmpeg); por defecto un proceso por núcleo
+MEDIA_POOL_WORKERS = int(os.getenv("MEDIA_POOL_WORKERS", str(os.cpu_count() or 2)))
+
+# Trazas por trabajo (/jobs/<id>/trace). TRACE_MEMORY añade el pico de memoria (tracemalloc)
+# por etapa; es global al proceso, así que con trabajos concurrentes los picos se mezclan.
+TRACE_MEMORY = os.getenv("TRACE_MEMORY", "false").lower() in ("1", "true", "yes")
+# Con PIPELINE_JOB_QUEUE las trazas terminadas también se guardan en Redis, para que la API
+# las sirva aunque el worker corra en otro nodo (segundos que se conservan)
+JOB_TRACE_TTL = int(os.getenv("JOB_TRACE_TTL", str(7 * 24 * 3600)))
+
+# Perfil de audio enviado a Deepgram: 'speech' (mono 16 kHz Opus) u 'original' (sin normalizar)
+TRANSCRIPTION_AUDIO_PROFILE = os.getenv("TRANSCRIPTION_AUDIO_PROFILE", "speech")
+TRANSCRIPTION_AUDIO_BITRATE = os.getenv("TRANSCRIPTION_AUDIO_BITRATE", "24k")
+
 # -------------------------
 # Flask + SocketIO
 # -------------------------
@@ -100,11 +212,566 @@ CORS(app,
      methods=["GET", "POST", "OPTIONS"])
 socketio = SocketIO(app, 
                    cors_allowed_origins=["http://localhost:5173", "http://127.0.0.1:5173"],
-                   async_mode='threading')
+                   async_mode='threading',
+                   message_queue=SOCKETIO_MESSAGE_QUEUE)
+if TRACE_MEMORY and not tracemalloc.is_tracing():
+    tracemalloc.start()
+if PIPELINE_JOB_QUEUE and not SOCKETIO_MESSAGE_QUEUE:
+    logger.warning("PIPELINE_JOB_QUEUE definida sin SOCKETIO_MESSAGE_QUEUE: los workers no podrán emitir a los clientes.")
+
+# -------------------------
+# Cola de trabajos (workers externos)
+# -------------------------
+_job_queue = None
+
+def get_job_queue():
+    """
+    Devuelve el cliente Redis de la cola de trabajos (creado una sola vez) o None
+    si PIPELINE_JOB_QUEUE no está configurada.
+    """
+    global _job_queue
+    if not PIPELINE_JOB_QUEUE:
+        return None
+    if _job_queue is None:
+        import redis
+        _job_queue = redis.Redis.from_url(PIPELINE_JOB_QUEUE)
+    return _job_queue
+
+def job_queue_key(job_class):
+    """Prefijo de las claves Redis de un carril (ver ENQUEUE_JOB_SCRIPT)."""
+    return f"{PIPELINE_JOB_QUEUE_KEY}:{job_class}"
+
+JOB_WAKE_KEY = f"{PIPELINE_JOB_QUEUE_KEY}:wake"
+JOB_RUNNING_KEY = f"{PIPELINE_JOB_QUEUE_KEY}:running"
+
+# Turnos justos entre usuarios en Redis, compartidos por todos los workers: por carril una
+# lista de trabajos por usuario (<carril>:user:<usuario>) y un anillo de usuarios con trabajo
+# (<carril>:ring) que se atiende por turnos. Cada usuario vuelve al final del anillo tras
+# entregar un trabajo, igual que los turnos de FairScheduler dentro de un proceso.
+ENQUEUE_JOB_SCRIPT = """
+redis.call('RPUSH', KEYS[1] .. ':user:' .. ARGV[1], ARGV[2])
+if redis.call('SADD', KEYS[1] .. ':active', ARGV[1]) == 1 then
+    redis.call('RPUSH', KEYS[1] .. ':ring', ARGV[1])
+end
+redis.call('RPUSH', KEYS[2], 1)
+redis.call('LTRIM', KEYS[2], 0, 99)
+"""
+
+# Toma el trabajo del siguiente usuario del anillo que no haya llegado a PIPELINE_MAX_PER_USER
+# trabajos en curso en todo el despliegue (<running>:<usuario>, sorted set job_id -> vencimiento;
+# el vencimiento libera el cupo si un worker muere sin liberarlo).
+POP_JOB_SCRIPT = """
+local ring = KEYS[1] .. ':ring'
+for i = 1, redis.call('LLEN', ring) do
+    local user = redis.call('LPOP', ring)
+    local running = KEYS[2] .. ':' .. user
+    redis.call('ZREMRANGEBYSCORE', running, '-inf', ARGV[1])
+    if redis.call('ZCARD', running) < tonumber(ARGV[3]) then
+        local queue = KEYS[1] .. ':user:' .. user
+        local job = redis.call('LPOP', queue)
+        if redis.call('LLEN', queue) > 0 then
+            redis.call('RPUSH', ring, user)
+        else
+            redis.call('SREM', KEYS[1] .. ':active', user)
+        end
+        if job then
+            redis.call('ZADD', running, tonumber(ARGV[1]) + tonumber(ARGV[2]), cjson.decode(job)['job_id'])
+            redis.call('EXPIRE', running, ARGV[2])
+            return job
+        end
+    else
+        redis.call('RPUSH', ring, user)
+    end
+end
+return false
+"""
+
+_job_scripts = {}
+
+def _job_script(name, source):
+    if name not in _job_scripts:
+        _job_scripts[name] = get_job_queue().register_script(source)
+    return _job_scripts[name]
+
+def enqueue_pipeline_job(data, sid=None, job_id=None, user=None, job_class='interactive'):
+    """
+    Encola el procesamiento. Con PIPELINE_JOB_QUEUE lo toma cualquier worker (worker.py),
+    que emite el progreso al sid (o sala) a través de SOCKETIO_MESSAGE_QUEUE; si no, lo
+    ejecuta el planificador de este proceso (ver FairScheduler).
+    """
+    queue = get_job_queue()
+    if queue is None:
+        get_scheduler().submit(background_task_handler, user=user, job_class=job_class, data=data, sid=sid, job_id=job_id)
+        return
+    user = user or 'anonymous'
+    job_id = job_id or uuid.uuid4().hex
+    job = {'data': data, 'sid': sid, 'job_id': job_id, 'user': user, 'job_class': job_class, 'enqueued_at': time.time()}
+    _job_script('enqueue', ENQUEUE_JOB_SCRIPT)(keys=[job_queue_key(job_class), JOB_WAKE_KEY], args=[user, json.dumps(job)])
+    logger.info(f"Job encolado en {job_queue_key(job_class)} para sid={sid} user={user}")
+
+def pop_pipeline_job(job_class):
+    """Siguiente trabajo del carril por turnos entre usuarios (dict) o None si no hay elegible."""
+    raw = _job_script('pop', POP_JOB_SCRIPT)(
+        keys=[job_queue_key(job_class), JOB_RUNNING_KEY],
+        args=[time.time(), JOB_FLAG_TTL, PIPELINE_MAX_PER_USER],
+    )
+    if raw is None:
+        return None
+    try:
+        return json.loads(raw)
+    except ValueError:
+        logger.error(f"Trabajo inválido descartado de {job_queue_key(job_class)}: {raw!r}")
+        return None
+
+def release_pipeline_job(user, job_id):
+    """Libera el cupo del usuario al terminar un trabajo tomado con pop_pipeline_job."""
+    try:
+        get_job_queue().zrem(f"{JOB_RUNNING_KEY}:{user}", job_id)
+    except Exception as e:
+        logger.warning(f"No se pudo liberar el cupo de {user} para {job_id}: {e}")
+
+def wait_for_pipeline_jobs(timeout=1):
+    """Bloquea hasta que se encole algún trabajo (o timeout); los workers ociosos esperan aquí."""
+    get_job_queue().blpop([JOB_WAKE_KEY], timeout=timeout)
+
+# -------------------------
+# Planificador justo (usuarios y tipos de trabajo)
+# -------------------------
+JOB_CLASSES = ('interactive', 'batch', 'preingest')
+
+class FairScheduler:
+    """
+    Ejecuta trabajos en `workers` hilos.
+    - Carriles (interactive/batch/preingest) con peso: cada carril avanza 1/peso en su
+      tiempo virtual al ser atendido y se elige el de menor tiempo (WFQ por pasos).
+    - Dentro del carril, turnos justos entre usuarios (mismo mecanismo, peso 1).
+    - Máximo max_per_user trabajos simultáneos por usuario.
+    - reserved_interactive hilos quedan solo para interactivos.
+    """
+
+    def __init__(self, workers, lane_weights, max_per_user, reserved_interactive):
+        self.workers = max(workers, 1)
+        self.lane_weights = lane_weights
+        self.max_per_user = max(max_per_user, 1)
+        self.reserved_interactive = min(max(reserved_interactive, 0), self.workers - 1)
+        self._cond = threading.Condition()
+        self._queues = {lane: {} for lane in lane_weights}      # carril -> usuario -> deque
+        self._lane_vtime = {lane: 0.0 for lane in lane_weights}
+        self._user_vtime = {lane: {} for lane in lane_weights}
+        self._running = 0
+        self._running_background = 0
+        self._running_by_user = {}
+        self._started = False
+
+    def start(self):
+        with self._cond:
+            if self._started:
+                return
+            self._started = True
+        for _ in range(self.workers):
+            socketio.start_background_task(self._worker_loop)
+        logger.info(f"Planificador: {self.workers} hilos, máx {self.max_per_user}/usuario, {self.reserved_interactive} reservados a interactivos")
+
+    def submit(self, fn, user=None, job_class='interactive', **kwargs):
+        """Encola fn(**kwargs); devuelve un Future con su resultado."""
+        lane = job_class if job_class in self._queues else 'batch'
+        user = user or 'anonymous'
+        future = Future()
+        with self._cond:
+            queues = self._queues[lane]
+            if not any(queues.values()):
+                # Un carril que vuelve a tener trabajo no acumula crédito del tiempo ocioso
+                self._lane_vtime[lane] = max(self._lane_vtime[lane], self._min_active_vtime(self._lane_vtime, self._active_lanes()))
+            if not queues.get(user):
+                users_vtime = self._user_vtime[lane]
+                users_vtime[user] = max(users_vtime.get(user, 0.0), self._min_active_vtime(users_vtime, [u for u, q in queues.items() if q]))
+            queues.setdefault(user, deque()).append((fn, kwargs, future))
+            self._cond.notify()
+        return future
+
+    def capacity_available(self):
+        with self._cond:
+            return self._running + self.pending() < self.workers
+
+    def background_capacity_available(self):
+        """Hay hilo libre para batch/pre-ingesta sin tocar los reservados a interactivos."""
+        with self._cond:
+            pending = sum(len(q) for lane, queues in self._queues.items() if lane != 'interactive' for q in queues.values())
+            return self._running_background + pending < self.workers - self.reserved_interactive
+
+    def pending(self):
+        return sum(len(q) for queues in self._queues.values() for q in queues.values())
+
+    def _active_lanes(self):
+        return [lane for lane, queues in self._queues.items() if any(queues.values())]
+
+    @staticmethod
+    def _min_active_vtime(vtimes, active):
+        return min((vtimes.get(k, 0.0) for k in active), default=0.0)
+
+    def _eligible_users(self, lane):
+        return [u for u, q in self._queues[lane].items() if q and self._running_by_user.get(u, 0) < self.max_per_user]
+
+    def _pick(self):
+        background_full = self._running_background >= self.workers - self.reserved_interactive
+        lanes = [lane for lane in self._active_lanes()
+                 if (lane == 'interactive' or not background_full) and self._eligible_users(lane)]
+        if not lanes:
+            return None
+        lane = min(lanes, key=lambda l: self._lane_vtime[l])
+        self._lane_vtime[lane] += 1.0 / self.lane_weights[lane]
+        users_vtime = self._user_vtime[lane]
+        user = min(self._eligible_users(lane), key=lambda u: users_vtime.get(u, 0.0))
+        users_vtime[user] = users_vtime.get(user, 0.0) + 1.0
+        fn, kwargs, future = self._queues[lane][user].popleft()
+        if not self._queues[lane][user]:
+            del self._queues[lane][user]
+        return lane, user, fn, kwargs, future
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                picked = self._pick()
+                while picked is None:
+                    self._cond.wait()
+                    picked = self._pick()
+                lane, user, fn, kwargs, future = picked
+                self._running += 1
+                self._running_by_user[user] = self._running_by_user.get(user, 0) + 1
+                if lane != 'interactive':
+                    self._running_background += 1
+            try:
+                if future.set_running_or_notify_cancel():
+                    future.set_result(fn(**kwargs))
+            except Exception as e:
+                logger.exception(f"Planificador: trabajo falló (user={user}, carril={lane}): {e}")
+                future.set_exception(e)
+            finally:
+                with self._cond:
+                    self._running -= 1
+                    self._running_by_user[user] -= 1
+                    if not self._running_by_user[user]:
+                        del self._running_by_user[user]
+                        # Sin trabajos en cola ni en curso se olvida su tiempo virtual
+                        # (sin Clerk el usuario es el sid, así que si no crecería sin límite)
+                        for l, users_vtime in self._user_vtime.items():
+                            if user not in self._queues[l]:
+                                users_vtime.pop(user, None)
+                    if lane != 'interactive':
+                        self._running_background -= 1
+                    self._cond.notify_all()
+
+_scheduler = None
+
+def get_scheduler():
+    """Planificador del proceso, creado (y con sus hilos arrancados) en el primer uso."""
+    global _scheduler
+    if _scheduler is None:
+        with _lazy_lock:
+            if _scheduler is None:
+                _scheduler = FairScheduler(PIPELINE_WORKERS, PIPELINE_LANE_WEIGHTS, PIPELINE_MAX_PER_USER, PIPELINE_RESERVED_INTERACTIVE)
+    _scheduler.start()
+    return _scheduler
+
+# -------------------------
+# Trabajos en curso y cancelación cooperativa
+# -------------------------
+JOB_CANCEL_KEY = "notiexpress:job_cancel:{}"
+JOB_DONE_KEY = "notiexpress:job_done:{}"
+JOB_FLAG_TTL = 3600
+REMOTE_CHECK_INTERVAL = 1.0
+
+class JobCancelled(Exception):
+    """El trabajo fue cancelado (cancel_processing o desconexión de todos sus clientes)."""
+
+class PipelineJob:
+    """
+    Estado de un procesamiento. Los clientes suscritos están en la sala job_id; cuando
+    no queda ninguno el trabajo se cancela. En modo worker la cancelación y el fin se
+    comparten entre procesos con claves en Redis.
+    """
+
+    def __init__(self, job_id, data, dedupe_key=None):
+        self.job_id = job_id
+        self.data = data
+        self.dedupe_key = dedupe_key
+        self.sids = set()
+        self.processes = set()
+        self._cancelled = threading.Event()
+        self._finished = threading.Event()
+        self._last_remote_check = {}
+        self._lock = threading.Lock()
+        self.trace = JobTrace(job_id)
+        self.running_here = False  # la traza en memoria solo es real en el proceso que lo ejecuta
+
+    def cancel(self, reason=""):
+        if self._cancelled.is_set():
+            return
+        logger.info(f"Cancelando job {self.job_id}: {reason}")
+        self._cancelled.set()
+        queue = get_job_queue()
+        if queue is not None:
+            try:
+                queue.set(JOB_CANCEL_KEY.format(self.job_id), reason or "1", ex=JOB_FLAG_TTL)
+            except Exception as e:
+                logger.warning(f"No se pudo propagar la cancelación de {self.job_id}: {e}")
+        self._kill_processes()
+
+    def _kill_processes(self):
+        with self._lock:
+            processes = list(self.processes)
+        for proc in processes:
+            kill_process(proc)
+
+    def _remote_flag(self, key):
+        """Consulta (como mucho una vez por REMOTE_CHECK_INTERVAL) una marca en Redis."""
+        queue = get_job_queue()
+        now = time.monotonic()
+        if queue is None or now - self._last_remote_check.get(key, 0.0) < REMOTE_CHECK_INTERVAL:
+            return False
+        self._last_remote_check[key] = now
+        try:
+            return bool(queue.exists(key.format(self.job_id)))
+        except Exception as e:
+            logger.warning(f"No se pudo consultar el estado remoto de {self.job_id}: {e}")
+            return False
+
+    @property
+    def cancelled(self):
+        if not self._cancelled.is_set() and self._remote_flag(JOB_CANCEL_KEY):
+            logger.info(f"Job {self.job_id} cancelado desde otro proceso")
+            self._cancelled.set()
+            self._kill_processes()
+        return self._cancelled.is_set()
+
+    @property
+    def finished(self):
+        if not self._finished.is_set() and self._remote_flag(JOB_DONE_KEY):
+            self._finished.set()
+        return self._finished.is_set()
+
+    def finish(self):
+        self._finished.set()
+        queue = get_job_queue()
+        if queue is not None:
+            try:
+                queue.set(JOB_DONE_KEY.format(self.job_id), "1", ex=JOB_FLAG_TTL)
+            except Exception as e:
+                logger.warning(f"No se pudo marcar {self.job_id} como terminado: {e}")
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled(self.job_id)
+
+    def register_process(self, proc):
+        with self._lock:
+            self.processes.add(proc)
+        if self._cancelled.is_set():
+            kill_process(proc)
+
+    def unregister_process(self, proc):
+        with self._lock:
+            self.processes.discard(proc)
+
+# -------------------------
+# Trazas por trabajo (formato Chrome trace-event)
+# -------------------------
+class JobTrace:
+    """
+    Árbol de spans de un trabajo como eventos 'X' de Chrome trace-event (chrome://tracing,
+    Perfetto). El anidamiento sale de los tiempos dentro de cada hilo.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.started_at = datetime.utcnow().isoformat()
+        self._t0 = time.perf_counter()
+        self._events = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def begin(self, name, **args):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        span = {'name': name, 'start': time.perf_counter(), 'args': args, 'peak': 0}
+        if TRACE_MEMORY and tracemalloc.is_tracing():
+            # El pico acumulado hasta aquí pertenece al span padre antes de reiniciarlo
+            if stack:
+                stack[-1]['peak'] = max(stack[-1]['peak'], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        stack.append(span)
+        return span
+
+    def end(self, span, error=None):
+        end = time.perf_counter()
+        stack = self._local.stack
+        if span in stack:
+            stack.remove(span)
+        args = dict(span['args'])
+        if error is not None:
+            args['error'] = repr(error)
+        if TRACE_MEMORY and tracemalloc.is_tracing():
+            span['peak'] = max(span['peak'], tracemalloc.get_traced_memory()[1])
+            args['peak_memory_bytes'] = span['peak']
+            if stack:
+                stack[-1]['peak'] = max(stack[-1]['peak'], span['peak'])
+        event = {
+            'name': span['name'],
+            'cat': 'pipeline',
+            'ph': 'X',
+            'ts': round((span['start'] - self._t0) * 1e6),
+            'dur': round((end - span['start']) * 1e6),
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': args,
+        }
+        with self._lock:
+            self._events.append(event)
+
+    def to_chrome(self):
+        with self._lock:
+            events = sorted(self._events, key=lambda e: e['ts'])
+        return {
+            'traceEvents': events,
+            'displayTimeUnit': 'ms',
+            'otherData': {'job_id': self.job_id, 'started_at': self.started_at},
+        }
+
+@contextmanager
+def trace_span(name, **args):
+    """
+    Span del trabajo actual (no-op fuera de un trabajo). Devuelve el dict de args para
+    que el código añada datos al terminar (bytes, status, etc.).
+    """
+    job = current_job()
+    if job is None:
+        yield args
+        return
+    span = job.trace.begin(name, **args)
+    try:
+        yield span['args']
+    except BaseException as e:
+        job.trace.end(span, error=e)
+        raise
+    job.trace.end(span)
+
+jobs = {}
+jobs_lock = threading.Lock()
+socket_users = {}  # sid -> user_id de la sesión de Clerk
+_current_job = threading.local()
+
+def current_job():
+    return getattr(_current_job, 'job', None)
+
+def raise_if_cancelled():
+    job = current_job()
+    if job is not None:
+        job.raise_if_cancelled()
+
+def kill_process(proc):
+    """Mata el proceso y su grupo (los comandos con shell=True lanzan ffmpeg como hijo)."""
+    import signal
+    if proc.poll() is not None:
+        return
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (AttributeError, OSError):
+        proc.kill()
+
+def run_cancellable(cmd, **kwargs):
+    """
+    subprocess.run con cancelación: registra el proceso en el job actual y lo mata si
+    el job se cancela. Devuelve CompletedProcess; con check=True lanza CalledProcessError.
+    """
+    import subprocess
+    check = kwargs.pop('check', False)
+    proc = subprocess.Popen(cmd, start_new_session=True, **kwargs)
+    job = current_job()
+    if job is not None:
+        job.register_process(proc)
+    try:
+        while True:
+            try:
+                stdout, stderr = proc.communicate(timeout=0.5)
+                break
+            except subprocess.TimeoutExpired:
+                if job is not None and job.cancelled:
+                    kill_process(proc)
+                    proc.communicate()
+                    raise JobCancelled(job.job_id)
+    finally:
+        if job is not None:
+            job.unregister_process(proc)
+    if check and proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, output=stdout, stderr=stderr)
+    return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+def job_dedupe_key(data):
+    """Peticiones idénticas comparten trabajo (y sala) en vez de procesarse dos veces."""
+    if data.get('force'):
+        return None
+    tipo_pauta = data.get('tipo_pauta')
+    if tipo_pauta == 'youtube':
+        return ('youtube', data.get('youtube_url'), bool(data.get('compact', COMPACT_RESULTS)))
+    return (tipo_pauta, str(data.get('id_pauta')), bool(data.get('compact', COMPACT_RESULTS)))
+
+def submit_pipeline_job(data, sid=None, user=None, job_class='interactive'):
+    """
+    Registra el trabajo (o se suscribe a uno idéntico en curso), une el sid a la sala
+    del trabajo y lo encola en el carril job_class a nombre de user. Devuelve el PipelineJob.
+    """
+    key = job_dedupe_key(data)
+    with jobs_lock:
+        # Trabajos ejecutados por workers: el registro local se limpia al verlos terminados
+        for stale in [j for j in jobs.values() if not j.sids and (j.finished or j.cancelled)]:
+            jobs.pop(stale.job_id, None)
+        job = None
+        if key is not None:
+            job = next((j for j in jobs.values() if j.dedupe_key == key and not j.cancelled and not j.finished), None)
+        created = job is None
+        if created:
+            job = PipelineJob(uuid.uuid4().hex, data, dedupe_key=key)
+            jobs[job.job_id] = job
+        if sid:
+            job.sids.add(sid)
+    if sid:
+        join_room(job.job_id, sid=sid)
+        socketio.emit('job_started', {'job_id': job.job_id, 'shared': not created}, to=sid)
+    if created:
+        enqueue_pipeline_job(data, sid=job.job_id, job_id=job.job_id, user=user, job_class=job_class)
+    else:
+        logger.info(f"sid={sid} suscrito al job en curso {job.job_id}")
+    return job
+
+def unsubscribe_sid(sid, job_id=None, reason=""):
+    """
+    Quita el sid de sus trabajos (o de job_id) y cancela los que quedan sin clientes.
+    Devuelve los job_id afectados.
+    """
+    affected = []
+    with jobs_lock:
+        for job in list(jobs.values()):
+            if sid not in job.sids or (job_id and job.job_id != job_id):
+                continue
+            job.sids.discard(sid)
+            affected.append(job)
+            if job.finished:
+                jobs.pop(job.job_id, None)
+    for job in affected:
+        try:
+            leave_room(job.job_id, sid=sid)
+        except Exception:
+            pass
+        if not job.sids and not job.finished:
+            job.cancel(reason)
+    return [job.job_id for job in affected]
+
 # -------------------------
 # Helpers: DB, URLs, descargas, ffmpeg
 # -------------------------
 def connect_to_db():
+    import mysql.connector
     try:
         return mysql.connector.connect(
             host=MYSQL_HOST,
@@ -126,6 +793,25 @@ def fetch_record_by_id_pauta_radio(cursor, id_pauta_radio):
     cursor.execute(sql, (id_pauta_radio,))
     return cursor.fetchone()
 
+PAUTA_TABLES = {
+    'tv': ('pautas_tv', 'id_pauta_tv'),
+    'radio': ('pautas_radio', 'id_pauta_radio'),
+}
+
+def fetch_new_pautas(cursor, tipo_pauta, after_id, limit):
+    """
+    Pautas con id mayor que la marca de agua, en orden ascendente.
+    Sin marca de agua devuelve las `limit` más recientes.
+    """
+    table, id_col = PAUTA_TABLES[tipo_pauta]
+    if after_id is None:
+        sql = f"SELECT p.* FROM {table} p ORDER BY p.{id_col} DESC LIMIT %s;"
+        cursor.execute(sql, (limit,))
+        return list(reversed(cursor.fetchall()))
+    sql = f"SELECT p.* FROM {table} p WHERE p.{id_col} > %s ORDER BY p.{id_col} ASC LIMIT %s;"
+    cursor.execute(sql, (after_id, limit))
+    return cursor.fetchall()
+
 def build_url_tv(record):
     id_pauta_tv = record[0]
     utc_date = record[-1]
@@ -146,18 +832,31 @@ def build_url_radio(record):
     day = local_date.strftime("%d")
     return f"https://servicios.noticiasperu.pe/medios/radio/{year}/{month}/{day}/{id_pauta_radio}.mp3"
 
-def download_file(url, filename, max_retries=3):
+def download_file(url, filename, max_retries=3, chunk_size=1024 * 1024):
     retries = 0
     while retries < max_retries:
+        raise_if_cancelled()
         try:
-            r = requests.get(url, timeout=30)
-            if r.status_code == 200:
-                with open(filename, "wb") as f:
-                    f.write(r.content)
-                logger.info(f"Downloaded file: {filename}")
-                return True
-            else:
-                logger.warning(f"Download failed {r.status_code} for {url}")
+            with trace_span("download", url=url, attempt=retries + 1) as span, requests.get(url, timeout=30, stream=True) as r:
+                span['status'] = r.status_code
+                if r.status_code == 200:
+                    downloaded = 0
+                    try:
+                        with open(filename, "wb") as f:
+                            for chunk in r.iter_content(chunk_size=chunk_size):
+                                raise_if_cancelled()
+                                f.write(chunk)
+                                downloaded += len(chunk)
+                    except JobCancelled:
+                        if os.path.exists(filename):
+                            os.remove(filename)
+                        raise
+                    finally:
+                        span['bytes'] = downloaded
+                    logger.info(f"Downloaded file: {filename}")
+                    return True
+                else:
+                    logger.warning(f"Download failed {r.status_code} for {url}")
         except requests.RequestException as e:
             logger.warning(f"Download attempt {retries+1} error: {e}")
         retries += 1
@@ -165,23 +864,90 @@ def download_file(url, filename, max_retries=3):
     logger.error(f"Failed to download {url} after {max_retries} attempts")
     return False
 
-def convert_mp4_to_mp3(mp4_path, mp3_path):
+_media_pool = None
+_media_submit_lock = threading.Lock()
+
+# Los hijos spawn re-ejecutan el __main__ del padre (app.py / api.py / worker.py, que importan
+# app: Flask, Socket.IO, init_results_db, tracemalloc). El pool los crea dentro de submit(),
+# así que mientras se encola se presenta este __main__ vacío y los hijos solo cargan media_pool.
+_SLIM_CHILD_MAIN = types.ModuleType("__main__")
+
+def get_media_pool():
+    """
+    Pool de procesos (spawn) para la conversión de medios, creado en el primer uso.
+    Así moviepy no compite por el GIL con los eventos de Socket.IO.
+    Encolar con submit_media_task (no directamente) para que los hijos arranquen livianos.
+    """
+    global _media_pool
+    if _media_pool is None:
+        with _lazy_lock:
+            if _media_pool is None:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                _media_pool = ProcessPoolExecutor(max_workers=MEDIA_POOL_WORKERS,
+                                                  mp_context=multiprocessing.get_context('spawn'),
+                                                  initializer=media_pool.init_worker)
+                logger.info(f"Pool de conversión de medios: {MEDIA_POOL_WORKERS} procesos")
+    return _media_pool
+
+def submit_media_task(fn, *args, **kwargs):
+    """submit() al pool con el __main__ liviano (ver _SLIM_CHILD_MAIN) por si crea procesos."""
+    pool = get_media_pool()
+    with _media_submit_lock:
+        main = sys.modules['__main__']
+        sys.modules['__main__'] = _SLIM_CHILD_MAIN
+        try:
+            return pool.submit(fn, *args, **kwargs)
+        finally:
+            sys.modules['__main__'] = main
+
+def run_in_media_pool(fn, *args, cancel_path=None):
+    """
+    Ejecuta fn(*args) en el pool y espera el resultado sin bloquear la cancelación: si el
+    job se cancela, crea cancel_path (la tarea lo detecta y se detiene) y lanza JobCancelled.
+    """
+    from concurrent.futures import TimeoutError as FuturesTimeout
+    from concurrent.futures.process import BrokenProcessPool
+    global _media_pool
+
+    def remove_cancel_flag(_future):
+        if cancel_path:
+            try:
+                os.remove(cancel_path)
+            except FileNotFoundError:
+                pass
+
+    # Un marcador de una cancelación anterior abortaría esta conversión al instante
+    remove_cancel_flag(None)
     try:
-        with VideoFileClip(mp4_path) as video:
-            audio = video.audio
-            audio.write_audiofile(mp3_path, verbose=False, logger=None)
-            audio.close()
-        logger.info(f"Converted {mp4_path} -> {mp3_path}")
-        return True
-    except Exception as e:
-        logger.exception(f"Error converting mp4 to mp3: {e}")
-        return False
+        future = submit_media_task(fn, *args, cancel_path=cancel_path)
+    except BrokenProcessPool:
+        logger.warning("Pool de medios roto, se recrea")
+        _media_pool = None
+        future = submit_media_task(fn, *args, cancel_path=cancel_path)
+    future.add_done_callback(remove_cancel_flag)
+
+    job = current_job()
+    while True:
+        try:
+            return future.result(timeout=0.5)
+        except FuturesTimeout:
+            if job is not None and job.cancelled:
+                if not future.cancel() and cancel_path and not future.done():
+                    open(cancel_path, "w").close()
+                    # Si terminó justo ahora su callback ya corrió: el marcador no se borraría
+                    if future.done():
+                        remove_cancel_flag(future)
+                raise JobCancelled(job.job_id)
+
+def convert_mp4_to_mp3(mp4_path, mp3_path):
+    return run_in_media_pool(media_pool.convert_mp4_to_mp3, mp4_path, mp3_path, cancel_path=f"{mp3_path}.cancel")
 
 def download_youtube_video(url, output_dir, max_retries=3, delay=5):
     """
     Descarga audio de YouTube basado en función que funciona con FB
     """
-    import subprocess
+    from yt_dlp import YoutubeDL, utils as ytdlp_utils
     
     for attempt in range(max_retries):
         try:
@@ -199,9 +965,12 @@ def download_youtube_video(url, output_dir, max_retries=3, delay=5):
                 'http_headers': {
                     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
                 },
+                # Se llaman en cada bloque descargado / paso de post-proceso: cortan la descarga al cancelar
+                'progress_hooks': [lambda d: raise_if_cancelled()],
+                'postprocessor_hooks': [lambda d: raise_if_cancelled()],
             }
 
-            with YoutubeDL(ydl_opts) as ydl:
+            with trace_span("youtube_download", url=url, attempt=attempt + 1) as span, YoutubeDL(ydl_opts) as ydl:
                 info = ydl.extract_info(url, download=True)
                 video_id = info['id']
                 mp3_file = os.path.join(output_dir, f"{video_id}.mp3")
@@ -230,21 +999,12 @@ def download_youtube_video(url, output_dir, max_retries=3, delay=5):
                             f'ffmpeg -i "{video_file}" -vn -acodec aac -strict experimental "temp_audio.aac" -y && ffmpeg -i "temp_audio.aac" -acodec libmp3lame -ab 192k "{mp3_file}" -y',
                         ]
 
-                        success = False
-                        for i, cmd in enumerate(ffmpeg_commands):
-                            try:
-                                logger.info(f"Intentando FFmpeg método {i+1}...")
-                                result = subprocess.run(cmd, shell=True, check=True, 
-                                                      stderr=subprocess.PIPE, stdout=subprocess.PIPE,
-                                                      cwd=output_dir)
-                                
-                                if os.path.exists(mp3_file) and os.path.getsize(mp3_file) > 0:
-                                    logger.info(f"✅ FFmpeg método {i+1} exitoso")
-                                    success = True
-                                    break
-                            except subprocess.CalledProcessError as e:
-                                logger.warning(f"FFmpeg método {i+1} falló: {e.stderr.decode()}")
-                                continue
+                        # Se ejecutan en el pool de medios; los intentos quedan en la traza
+                        with trace_span("ffmpeg_extract_audio") as ffmpeg_span:
+                            success, ffmpeg_attempts = run_in_media_pool(
+                                media_pool.run_ffmpeg_commands, ffmpeg_commands, output_dir, mp3_file,
+                                cancel_path=f"{mp3_file}.cancel")
+                            ffmpeg_span['attempts'] = [{k: v for k, v in a.items() if k != 'error'} for a in ffmpeg_attempts]
 
                         # Limpiar archivos temporales
                         for temp_file in [os.path.join(output_dir, 'temp_audio.wav'), 
@@ -263,9 +1023,12 @@ def download_youtube_video(url, output_dir, max_retries=3, delay=5):
                 if not os.path.exists(mp3_file):
                     raise Exception("No se pudo crear el archivo MP3")
 
+                span['bytes'] = os.path.getsize(mp3_file)
                 logger.info(f"✅ Descarga exitosa: {mp3_file}")
                 return mp3_file
 
+        except JobCancelled:
+            raise
         except ytdlp_utils.ExtractorError as e:
             error_msg = str(e).lower()
             if 'private' in error_msg:
@@ -280,6 +1043,8 @@ def download_youtube_video(url, output_dir, max_retries=3, delay=5):
                 logger.warning(f"yt-dlp extractor error (attempt {attempt+1}): {e}")
                 
         except Exception as e:
+            # yt-dlp puede envolver la excepción del hook de progreso
+            raise_if_cancelled()
             logger.warning(f"yt-dlp general error (attempt {attempt+1}): {e}")
             
         # Cleanup en caso de error
@@ -292,6 +1057,7 @@ def download_youtube_video(url, output_dir, max_retries=3, delay=5):
             pass
             
         if attempt < max_retries - 1:
+            raise_if_cancelled()
             wait_time = delay * (attempt + 1)
             logger.info(f"Waiting {wait_time} seconds before retry...")
             time.sleep(wait_time)
@@ -299,19 +1065,103 @@ def download_youtube_video(url, output_dir, max_retries=3, delay=5):
     logger.error(f"Failed to download {url} after {max_retries} attempts")
     return None
 # -------------------------
+# Normalización de audio para transcripción
+# -------------------------
+# Deepgram solo necesita voz mono a 16 kHz; subir el MP3 estéreo de 192k multiplica el tamaño sin mejorar la transcripción.
+AUDIO_PROFILES = {
+    'speech': {
+        'ext': 'ogg',
+        'content_type': 'audio/ogg',
+        'ffmpeg_args': ['-vn', '-ac', '1', '-ar', '16000', '-c:a', 'libopus', '-b:a', TRANSCRIPTION_AUDIO_BITRATE, '-application', 'voip'],
+    },
+}
+
+def normalize_audio_for_transcription(audio_file, profile=None):
+    """
+    Convierte el audio al perfil compacto configurado antes de subirlo a Deepgram.
+    Devuelve (ruta, content_type, stats) con stats = {'profile', 'original_bytes',
+    'normalized_bytes', 'bytes_saved'}, que se guardan con el resultado (ver
+    /stats/audio-normalization). Si el perfil es 'original' o ffmpeg falla,
+    devuelve el archivo original sin cambios (bytes_saved = 0).
+    """
+    import subprocess
+
+    profile = profile or TRANSCRIPTION_AUDIO_PROFILE
+    original_bytes = os.path.getsize(audio_file)
+    stats = {'profile': profile, 'original_bytes': original_bytes, 'normalized_bytes': original_bytes, 'bytes_saved': 0}
+    spec = AUDIO_PROFILES.get(profile)
+    if spec is None:
+        if profile != 'original':
+            logger.warning(f"Perfil de audio desconocido '{profile}', se envía el archivo original")
+        return audio_file, "audio/mpeg", stats
+
+    base, _ = os.path.splitext(audio_file)
+    out_path = f"{base}.{profile}.{spec['ext']}"
+    cmd = ['ffmpeg', '-y', '-i', audio_file] + spec['ffmpeg_args'] + [out_path]
+    with trace_span("normalize_audio", profile=profile, original_bytes=original_bytes) as span:
+        try:
+            run_cancellable(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except JobCancelled:
+            if os.path.exists(out_path):
+                os.remove(out_path)
+            raise
+        except (OSError, subprocess.CalledProcessError) as e:
+            stderr = getattr(e, 'stderr', None)
+            logger.warning(f"Normalización de audio falló, se usa el original: {stderr.decode(errors='ignore') if stderr else e}")
+            if os.path.exists(out_path):
+                os.remove(out_path)
+            span.update(normalized_bytes=original_bytes, bytes_saved=0, fallback='ffmpeg_error')
+            return audio_file, "audio/mpeg", stats
+
+        normalized_bytes = os.path.getsize(out_path)
+        if normalized_bytes == 0 or normalized_bytes >= original_bytes:
+            logger.info(f"Audio normalizado no es más pequeño ({normalized_bytes} >= {original_bytes} bytes), se usa el original")
+            os.remove(out_path)
+            span.update(normalized_bytes=original_bytes, bytes_saved=0, fallback='not_smaller')
+            return audio_file, "audio/mpeg", stats
+
+        saved = original_bytes - normalized_bytes
+        stats.update(normalized_bytes=normalized_bytes, bytes_saved=saved)
+        span.update(normalized_bytes=normalized_bytes, bytes_saved=saved)
+
+    logger.info(f"Audio normalizado ({profile}): {original_bytes} -> {normalized_bytes} bytes, ahorro {saved} bytes ({saved * 100 // original_bytes}%)")
+    return out_path, spec['content_type'], stats
+
+# -------------------------
 # Transcription (Deepgram)
 # -------------------------
-def transcribe_audio_with_deepgram(audio_file, timeout=600):
+class CancellableReader:
+    """Archivo para el cuerpo de requests: se sube por bloques y se corta si el job se cancela."""
+
+    def __init__(self, path):
+        self._f = open(path, "rb")
+        self._size = os.path.getsize(path)
+
+    def __len__(self):
+        return self._size
+
+    def read(self, size=-1):
+        raise_if_cancelled()
+        return self._f.read(size)
+
+    def close(self):
+        self._f.close()
+
+def transcribe_audio_with_deepgram(audio_file, timeout=600, content_type="audio/mpeg"):
     if not DEEPGRAM_API_KEY:
         logger.error("DEEPGRAM_API_KEY no configurada")
         return ""
     try:
         url = "https://api.deepgram.com/v1/listen"
-        headers = {"Authorization": f"Token {DEEPGRAM_API_KEY}", "Content-Type": "audio/mpeg"}
+        headers = {"Authorization": f"Token {DEEPGRAM_API_KEY}", "Content-Type": content_type}
         params = {"model": "nova-2", "language": "es", "smart_format": "true"}
-        with open(audio_file, "rb") as f:
-            data = f.read()
-        r = requests.post(url, headers=headers, params=params, data=data, timeout=timeout)
+        body = CancellableReader(audio_file)
+        try:
+            with trace_span("deepgram_transcription", bytes=len(body), content_type=content_type) as span:
+                r = requests.post(url, headers=headers, params=params, data=body, timeout=timeout)
+                span['status'] = r.status_code
+        finally:
+            body.close()
         logger.info(f"Deepgram response: {r.status_code}")
         if r.status_code == 200:
             resp = r.json()
@@ -320,6 +1170,9 @@ def transcribe_audio_with_deepgram(audio_file, timeout=600):
         else:
             logger.error(f"Deepgram error {r.status_code}: {r.text}")
             return ""
+    except JobCancelled:
+        # CancellableReader corta la subida; no es un error de Deepgram
+        raise
     except Exception as e:
         logger.exception(f"Deepgram exception: {e}")
         return ""
@@ -346,6 +1199,7 @@ def split_text(text, max_tokens=8000):
     return chunks
 
 def summarize_text_with_gpt(text, max_retries=3):
+    client = get_openai_client()
     if client is None:
         logger.warning("OpenAI not configured - returning short excerpt as summary")
         return (text[:400] + "...") if len(text) > 400 else text
@@ -355,12 +1209,13 @@ def summarize_text_with_gpt(text, max_retries=3):
         try:
             chunks = split_text(text)
             summaries = []
-            for ch in chunks:
-                response = client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[{"role":"system","content":prompt},{"role":"user","content":ch}],
-                    max_tokens=150
-                )
+            for i, ch in enumerate(chunks):
+                with trace_span("gpt.summarize", model="gpt-4o-mini", attempt=retries + 1, chunk=i + 1, chunks=len(chunks)):
+                    response = client.chat.completions.create(
+                        model="gpt-4o-mini",
+                        messages=[{"role":"system","content":prompt},{"role":"user","content":ch}],
+                        max_tokens=150
+                    )
                 summaries.append(response.choices[0].message.content.strip())
             return " ".join(summaries)
         except Exception as e:
@@ -370,17 +1225,19 @@ def summarize_text_with_gpt(text, max_retries=3):
     return ""
 
 def generar_titular_con_gpt(text, max_retries=3):
+    client = get_openai_client()
     if client is None:
         return (text[:60] + "...") if len(text) > 60 else text
     retries = 0
     prompt = "Genera un titular conciso y atractivo para la siguiente noticia, que se asume ocurre en Perú a menos que se especifique lo contrario."
     while retries < max_retries:
         try:
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo-1106",
-                messages=[{"role":"system","content":prompt},{"role":"user","content":text}],
-                max_tokens=60
-            )
+            with trace_span("gpt.titular", model="gpt-3.5-turbo-1106", attempt=retries + 1):
+                response = client.chat.completions.create(
+                    model="gpt-3.5-turbo-1106",
+                    messages=[{"role":"system","content":prompt},{"role":"user","content":text}],
+                    max_tokens=60
+                )
             return response.choices[0].message.content.strip()
         except Exception as e:
             logger.warning(f"Titular attempt {retries+1} failed: {e}")
@@ -392,6 +1249,7 @@ def generar_titular_con_gpt(text, max_retries=3):
 # Entidades, clasificación y keywords (manteniendo tu lógica)
 # -------------------------
 def extract_entities(text):
+    client = get_openai_client()
     if client is None:
         # fallback: very simple regex-based entity extraction (names + all caps words)
         persons = re.findall(r"\b[A-Z][a-z]+(?:\s[A-Z][a-z]+){0,2}\b", text)[:10]
@@ -415,11 +1273,12 @@ def extract_entities(text):
 
         Texto: {text[:2000]}
         """
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role":"system","content":"Eres un asistente experto en identificación y corrección de entidades nombradas, con conocimiento especial sobre Perú."},{"role":"user","content":prompt}],
-            max_tokens=300
-        )
+        with trace_span("gpt.entities", model="gpt-4o-mini"):
+            response = client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[{"role":"system","content":"Eres un asistente experto en identificación y corrección de entidades nombradas, con conocimiento especial sobre Perú."},{"role":"user","content":prompt}],
+                max_tokens=300
+            )
         entities_response = response.choices[0].message.content.strip()
         entities = {}
         for line in entities_response.split('\n'):
@@ -528,6 +1387,7 @@ def classify_theme(text):
         "Privacidad y Protección de Datos", "Big Data", "Analítica de Datos",
         "Machine Learning", "Computación Cuántica", "Supercomputación",
         "Otros"]
+    client = get_openai_client()
     if client is None:
         # simple keyword matching fallback
         lower = text.lower()
@@ -540,11 +1400,12 @@ def classify_theme(text):
         return found[:3] if found else ["Otro"]
     try:
         prompt = f"Clasifica el tema de la siguiente transcripción en hasta tres de estas categorías: {', '.join(categories)}. Transcripción: {text[:2000]}"
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo-1106",
-            messages=[{"role":"system","content":prompt}],
-            max_tokens=120
-        )
+        with trace_span("gpt.classify_theme", model="gpt-3.5-turbo-1106"):
+            response = client.chat.completions.create(
+                model="gpt-3.5-turbo-1106",
+                messages=[{"role":"system","content":prompt}],
+                max_tokens=120
+            )
         themes = response.choices[0].message.content.strip()
         valid = [c for c in categories if c.lower() in themes.lower()]
         return valid[:3] if valid else ["Otro"]
@@ -552,18 +1413,37 @@ def classify_theme(text):
         logger.warning(f"Theme classify failed: {e}")
         return ["Otro"]
 
+EMAIL_RE = re.compile(r"^[^@\s<>,;]+@[^@\s<>,;]+\.[^@\s<>,;]+$")
+
+def parse_emails(value):
+    """
+    Direcciones de una celda de email del Excel: separadas por ';', ',' o salto de línea.
+    Las que no tienen forma de dirección se descartan con un aviso.
+    """
+    emails = []
+    for part in re.split(r"[;,\n]", str(value or "")):
+        email = part.strip()
+        if not email:
+            continue
+        if EMAIL_RE.match(email):
+            emails.append(email)
+        else:
+            logger.warning(f"Email inválido en el Excel de palabras clave, se ignora: {email!r}")
+    return emails
+
 def cargar_palabras_clave_excel():
     ruta_excel = os.path.join(os.getcwd(), 'queries_av_3.0.xlsx')
     if not os.path.exists(ruta_excel):
         logger.warning("Keyword Excel not found")
         return {}
+    import openpyxl
     wb = openpyxl.load_workbook(ruta_excel)
     hoja = wb.active
     palabras_clave = {}
     for fila in hoja.iter_rows(min_row=2, values_only=True):
         if fila and len(fila) >= 3:
             cliente, keywords, email = fila[:3]
-            emails = [e.strip() for e in str(email).split(',')] if email else []
+            emails = parse_emails(email)
             palabras_clave.setdefault(cliente, {'palabras': [], 'email': emails})
             if keywords:
                 palabras_clave[cliente]['palabras'].extend([k.strip() for k in str(keywords).split(';') if k.strip()])
@@ -591,22 +1471,795 @@ def verificar_palabras_clave(transcription, entities, themes, palabras_clave):
                     break
     return coincidencias
 
+def diff_keyword_catalogs(old, new):
+    """
+    Parte del catálogo nuevo que no estaba en el viejo: clientes nuevos completos y,
+    en los existentes, solo las palabras clave agregadas o modificadas.
+    """
+    diff = {}
+    for cliente, info in new.items():
+        old_words = {p.strip().lower() for p in (old.get(cliente) or {}).get('palabras', [])}
+        added = [p for p in info['palabras'] if p.strip().lower() not in old_words]
+        if added:
+            diff[cliente] = {'palabras': added, 'email': info.get('email', [])}
+    return diff
+
+def rematch_stored_results(desde=None, hasta=None, batch_size=500):
+    """
+    Re-verifica los resultados almacenados contra el catálogo actual sin volver a
+    transcribir: por cada versión de catálogo con la que se procesaron, solo se prueban
+    las palabras nuevas o cambiadas, y solo para clientes que aún no tenían coincidencia
+    en ese resultado (verificar_palabras_clave registra una por cliente).
+    Devuelve (catalog_hash, resultados revisados, nuevas coincidencias).
+    """
+    sync_results_log()  # resultados que otros nodos guardaron y aún no llegaron a esta copia
+    palabras_clave = cargar_palabras_clave_excel()
+    current_hash = snapshot_keyword_catalog(palabras_clave)
+    diffs = {}
+    nuevas = []
+    scanned = 0
+    updates = []
+
+    def flush(conn):
+        with conn:
+            conn.executemany("UPDATE resultados SET coincidencias = ?, catalog_hash = ? WHERE id = ?", updates)
+        publish_store_change('coincidencias', {'updates': updates})
+        updates.clear()
+
+    with closing(connect_results_db()) as write_conn:
+        for stored in iter_results_for_rematch(current_hash, desde, hasta):
+            scanned += 1
+            old_hash = stored['catalog_hash']
+            if old_hash not in diffs:
+                old_catalog = load_keyword_catalog(old_hash) if old_hash else None
+                # Sin catálogo previo conocido se prueba el catálogo completo
+                diffs[old_hash] = diff_keyword_catalogs(old_catalog, palabras_clave) if old_catalog is not None else palabras_clave
+            matched = {c['cliente'] for c in stored['coincidencias']}
+            candidates = {cliente: info for cliente, info in diffs[old_hash].items() if cliente not in matched}
+            found = verificar_palabras_clave(stored['transcripcion'], stored['entidades'], stored['temas'], candidates) if candidates else []
+
+            coincidencias = stored['coincidencias'] + found
+            updates.append((json.dumps(coincidencias, ensure_ascii=False), current_hash, stored['result_id']))
+            if found:
+                data = {'tipo_pauta': stored['tipo_pauta'], 'id_pauta': stored['id_pauta'], 'youtube_url': stored['youtube_url']}
+                dispatch_alerts(found, palabras_clave, stored, data)
+                nuevas.extend(dict(c, result_id=stored['result_id'], titular=stored['titular']) for c in found)
+            if len(updates) >= batch_size:
+                flush(write_conn)
+        if updates:
+            flush(write_conn)
+
+    logger.info(f"Re-match con catálogo {current_hash[:12]}: {scanned} resultados revisados, {len(nuevas)} coincidencias nuevas")
+    return current_hash, scanned, nuevas
+
+_rematch_lock = threading.Lock()
+REMATCH_ACTIVE_KEY = "notiexpress:rematch_active"
+REMATCH_ACTIVE_TTL = 6 * 3600  # una ejecución colgada (proceso caído) deja de bloquear tras este tiempo
+
+def _publish_rematch_run(conn, run_id):
+    row = conn.execute("SELECT * FROM rematch_runs WHERE id = ?", (run_id,)).fetchone()
+    if row:
+        publish_store_change('rematch_run', dict(row))
+
+def run_rematch_job(run_id, desde=None, hasta=None):
+    """
+    Ejecuta rematch_stored_results en el planificador (carril batch) y deja el resultado en
+    rematch_runs para GET /rematch/<id>. Las ejecuciones de un proceso van de a una.
+    """
+    def update(**fields):
+        with closing(connect_results_db()) as conn, conn:
+            conn.execute(f"UPDATE rematch_runs SET {', '.join(f'{k} = ?' for k in fields)} WHERE id = ?", (*fields.values(), run_id))
+            _publish_rematch_run(conn, run_id)
+
+    with _rematch_lock:
+        try:
+            update(status='running')
+            catalog_hash, scanned, nuevas = rematch_stored_results(desde, hasta)
+            update(status='done', catalog_hash=catalog_hash, resultados_revisados=scanned,
+                   coincidencias=json.dumps(nuevas, ensure_ascii=False), finished_at=datetime.utcnow().isoformat())
+        except Exception as e:
+            logger.exception(f"Re-match {run_id} falló: {e}")
+            update(status='error', error=str(e), finished_at=datetime.utcnow().isoformat())
+        finally:
+            queue = get_job_queue()
+            if queue is not None and queue.get(REMATCH_ACTIVE_KEY) == run_id.encode():
+                queue.delete(REMATCH_ACTIVE_KEY)
+
+def submit_rematch_job(desde=None, hasta=None, user=None):
+    """
+    Encola un re-match y devuelve (job_id, creado). Si ya hay uno en cola o en curso en
+    cualquier proceso devuelve el suyo: dos barridos a la vez enviarían alertas duplicadas.
+    Con PIPELINE_JOB_QUEUE la exclusión es una clave en Redis; si no, la fila en rematch_runs.
+    """
+    run_id = uuid.uuid4().hex
+    now = datetime.utcnow()
+    queue = get_job_queue()
+    if queue is not None and not queue.set(REMATCH_ACTIVE_KEY, run_id, nx=True, ex=REMATCH_ACTIVE_TTL):
+        active = queue.get(REMATCH_ACTIVE_KEY)
+        if active:
+            return active.decode(), False
+        return submit_rematch_job(desde, hasta, user)  # venció entre SET y GET
+    with closing(connect_results_db()) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        if queue is None:
+            active = conn.execute(
+                "SELECT id FROM rematch_runs WHERE status IN ('queued', 'running') AND created_at >= ? ORDER BY created_at LIMIT 1",
+                ((now - timedelta(seconds=REMATCH_ACTIVE_TTL)).isoformat(),),
+            ).fetchone()
+            if active:
+                conn.rollback()
+                return active['id'], False
+        conn.execute(
+            "INSERT INTO rematch_runs (id, created_at, status, desde, hasta) VALUES (?, ?, 'queued', ?, ?)",
+            (run_id, now.isoformat(), desde, hasta),
+        )
+        conn.commit()
+        _publish_rematch_run(conn, run_id)
+    get_scheduler().submit(run_rematch_job, user=user, job_class='batch', run_id=run_id, desde=desde, hasta=hasta)
+    return run_id, True
+
+def load_rematch_run(run_id):
+    with closing(connect_results_db()) as conn:
+        row = conn.execute("SELECT * FROM rematch_runs WHERE id = ?", (run_id,)).fetchone()
+    if row is None and sync_results_log():
+        # Lanzado desde otro proceso API: su estado llega por la réplica del almacén
+        with closing(connect_results_db()) as conn:
+            row = conn.execute("SELECT * FROM rematch_runs WHERE id = ?", (run_id,)).fetchone()
+    if not row:
+        return None
+    run = dict(row)
+    run['job_id'] = run.pop('id')
+    run['coincidencias'] = json.loads(run['coincidencias']) if run['coincidencias'] else []
+    return run
+
+# -------------------------
+# Alertas por correo (coincidencias de palabras clave)
+# -------------------------
+class AlertDispatcher:
+    """
+    Envía las coincidencias a los emails del cliente (columna email del Excel) fuera
+    del pipeline: enqueue() solo encola; un hilo agrupa por destinatario durante
+    `window` segundos y envía un correo por lote reutilizando una conexión SMTP.
+    """
+
+    def __init__(self, window=60, max_batch=50, idle_timeout=120):
+        import queue
+        self.window = window
+        self.max_batch = max_batch
+        self.idle_timeout = idle_timeout
+        self._queue = queue.Queue()
+        self._pending = {}   # email -> (primera_alerta_monotonic, [alertas])
+        self._smtp = None
+        self._smtp_last_used = 0.0
+        self._started = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        socketio.start_background_task(self._run)
+
+    def enqueue(self, coincidencias, palabras_clave, result, data):
+        """Encola una alerta por coincidencia y dirección del cliente (una entrada por dirección)."""
+        for c in coincidencias:
+            emails = []
+            # Catálogos guardados antes de separar por ';' pueden traer varias direcciones en una
+            for raw in (palabras_clave.get(c['cliente']) or {}).get('email') or []:
+                for email in parse_emails(raw):
+                    if email.lower() not in emails:
+                        emails.append(email.lower())
+            alert = {
+                'cliente': c['cliente'],
+                'palabra_clave': c['palabra_clave'],
+                'tipo': c['tipo'],
+                'titular': result.get('titular'),
+                'resumen': result.get('resumen'),
+                'result_id': result.get('result_id'),
+                'tipo_pauta': data.get('tipo_pauta'),
+                'id_pauta': data.get('id_pauta') or data.get('youtube_url'),
+            }
+            for email in emails:
+                self._queue.put((email, alert))
+
+    def _run(self):
+        import queue
+        while True:
+            # Un error inesperado no puede matar el hilo: las alertas seguirían encolándose sin enviarse
+            try:
+                timeout = self._next_deadline()
+                try:
+                    email, alert = self._queue.get(timeout=timeout)
+                    first, alerts = self._pending.setdefault(email, (time.monotonic(), []))
+                    alerts.append(alert)
+                except queue.Empty:
+                    pass
+                self._flush_due()
+                if self._smtp is not None and time.monotonic() - self._smtp_last_used > self.idle_timeout:
+                    self._close_smtp()
+            except Exception as e:
+                logger.exception(f"Despachador de alertas: error inesperado: {e}")
+                time.sleep(1)
+
+    def _next_deadline(self):
+        if not self._pending:
+            return self.idle_timeout if self._smtp is not None else None
+        oldest = min(first for first, _ in self._pending.values())
+        return max(oldest + self.window - time.monotonic(), 0.05)
+
+    def _flush_due(self):
+        now = time.monotonic()
+        for email in list(self._pending):
+            first, alerts = self._pending[email]
+            if now - first >= self.window or len(alerts) >= self.max_batch:
+                del self._pending[email]
+                self._send(email, alerts)
+
+    def _build_message(self, email, alerts):
+        from email.message import EmailMessage
+        clientes = sorted({a['cliente'] for a in alerts})
+        msg = EmailMessage()
+        msg['From'] = ALERT_FROM
+        msg['To'] = email
+        # Celdas del Excel con Alt+Enter traen saltos de línea, no permitidos en cabeceras
+        asunto = f"Alertas de monitoreo: {len(alerts)} coincidencia(s) - {', '.join(clientes)}"
+        msg['Subject'] = " ".join(asunto.split())
+        lines = []
+        for a in alerts:
+            lines.append(f"• {a['cliente']} - {a['palabra_clave']} ({a['tipo']})")
+            lines.append(f"  Pauta: {a['tipo_pauta']} {a['id_pauta']}")
+            if a.get('titular'):
+                lines.append(f"  Titular: {a['titular']}")
+            if a.get('resumen'):
+                lines.append(f"  Resumen: {a['resumen']}")
+            if a.get('result_id'):
+                lines.append(f"  Detalle: {API_HOST}/results/{a['result_id']}")
+            lines.append("")
+        msg.set_content("\n".join(lines))
+        return msg
+
+    def _get_smtp(self):
+        import smtplib
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except smtplib.SMTPException:
+                pass
+            self._close_smtp()
+        smtp = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30)
+        if SMTP_STARTTLS:
+            smtp.starttls()
+        if SMTP_USER and SMTP_PASSWORD:
+            smtp.login(SMTP_USER, SMTP_PASSWORD)
+        self._smtp = smtp
+        return smtp
+
+    def _close_smtp(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except Exception:
+            pass
+        self._smtp = None
+
+    def _send(self, email, alerts):
+        try:
+            msg = self._build_message(email, alerts)
+        except Exception as e:
+            logger.exception(f"No se pudo armar la alerta para {email}; {len(alerts)} coincidencia(s) descartadas: {e}")
+            return
+        for attempt in range(2):
+            try:
+                self._get_smtp().send_message(msg)
+                self._smtp_last_used = time.monotonic()
+                logger.info(f"Alerta enviada a {email}: {len(alerts)} coincidencia(s)")
+                return
+            except Exception as e:
+                logger.warning(f"Envío de alerta a {email} falló (intento {attempt+1}): {e}")
+                self._close_smtp()
+        logger.error(f"No se pudo enviar la alerta a {email}; {len(alerts)} coincidencia(s) descartadas")
+
+_alert_dispatcher = None
+
+def get_alert_dispatcher():
+    """Despachador del proceso (arrancado en el primer uso) o None si no hay SMTP_HOST."""
+    global _alert_dispatcher
+    if not SMTP_HOST:
+        return None
+    if _alert_dispatcher is None:
+        with _lazy_lock:
+            if _alert_dispatcher is None:
+                _alert_dispatcher = AlertDispatcher(ALERT_BATCH_WINDOW, ALERT_MAX_BATCH, ALERT_SMTP_IDLE)
+    _alert_dispatcher.start()
+    return _alert_dispatcher
+
+def dispatch_alerts(coincidencias, palabras_clave, result, data):
+    dispatcher = get_alert_dispatcher()
+    if dispatcher is not None and coincidencias:
+        dispatcher.enqueue(coincidencias, palabras_clave, result, data)
+
+# -------------------------
+# Almacén de resultados (SQLite)
+# -------------------------
+def connect_results_db():
+    conn = sqlite3.connect(RESULTS_DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def init_results_db():
+    with closing(connect_results_db()) as conn, conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS resultados (
+                id TEXT PRIMARY KEY,
+                tipo_pauta TEXT,
+                id_pauta TEXT,
+                youtube_url TEXT,
+                created_at TEXT NOT NULL,
+                titular TEXT,
+                resumen TEXT,
+                temas TEXT,
+                entidades TEXT,
+                coincidencias TEXT,
+                transcripcion_gz BLOB
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_resultados_pauta ON resultados (tipo_pauta, id_pauta)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_resultados_created ON resultados (created_at)")
+        columns = {row['name'] for row in conn.execute("PRAGMA table_info(resultados)")}
+        if 'catalog_hash' not in columns:
+            # Versión del catálogo de palabras clave con la que se calcularon las coincidencias
+            conn.execute("ALTER TABLE resultados ADD COLUMN catalog_hash TEXT")
+        # Normalización del audio enviado a Deepgram (perfil y bytes antes/después)
+        for column, sql_type in (('audio_profile', 'TEXT'), ('audio_original_bytes', 'INTEGER'), ('audio_normalized_bytes', 'INTEGER')):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE resultados ADD COLUMN {column} {sql_type}")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS keyword_catalogs (
+                hash TEXT PRIMARY KEY,
+                created_at TEXT NOT NULL,
+                catalog TEXT NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS job_traces (
+                job_id TEXT PRIMARY KEY,
+                created_at TEXT NOT NULL,
+                trace_gz BLOB NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS rematch_runs (
+                id TEXT PRIMARY KEY,
+                created_at TEXT NOT NULL,
+                finished_at TEXT,
+                status TEXT NOT NULL,
+                desde TEXT,
+                hasta TEXT,
+                catalog_hash TEXT,
+                resultados_revisados INTEGER,
+                coincidencias TEXT,
+                error TEXT
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS preingest_watermarks (
+                tipo_pauta TEXT PRIMARY KEY,
+                last_id INTEGER NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS store_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        """)
+
+init_results_db()
+
+# -------------------------
+# Réplica del almacén entre nodos (stream de Redis)
+# -------------------------
+def publish_store_change(kind, payload):
+    """
+    Publica una escritura del almacén (result / catalog / coincidencias / watermark / rematch_run) para
+    que los demás nodos la apliquen. Sin PIPELINE_JOB_QUEUE no hace nada.
+    """
+    queue = get_job_queue()
+    if queue is None:
+        return
+    try:
+        queue.xadd(RESULTS_LOG_KEY, {'kind': kind, 'payload': gzip.compress(json.dumps(payload, ensure_ascii=False).encode('utf-8'))},
+                   maxlen=RESULTS_LOG_MAXLEN, approximate=True)
+    except Exception as e:
+        logger.error(f"No se pudo publicar '{kind}' en {RESULTS_LOG_KEY}; los demás nodos no lo verán: {e}")
+
+def _apply_store_change(conn, kind, payload):
+    if kind == 'result':
+        columns = {row['name'] for row in conn.execute("PRAGMA table_info(resultados)")}
+        row = {k: v for k, v in payload.items() if k in columns}
+        row['transcripcion_gz'] = base64.b64decode(row['transcripcion_gz']) if row.get('transcripcion_gz') else None
+        conn.execute(f"INSERT OR IGNORE INTO resultados ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})", tuple(row.values()))
+    elif kind == 'catalog':
+        conn.execute("INSERT OR IGNORE INTO keyword_catalogs (hash, created_at, catalog) VALUES (?, ?, ?)",
+                     (payload['hash'], payload['created_at'], payload['catalog']))
+    elif kind == 'coincidencias':
+        conn.executemany("UPDATE resultados SET coincidencias = ?, catalog_hash = ? WHERE id = ?", [tuple(u) for u in payload['updates']])
+    elif kind == 'rematch_run':
+        conn.execute(f"INSERT OR REPLACE INTO rematch_runs ({', '.join(payload)}) VALUES ({', '.join('?' * len(payload))})", tuple(payload.values()))
+    elif kind == 'watermark':
+        conn.execute(
+            "INSERT INTO preingest_watermarks (tipo_pauta, last_id, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(tipo_pauta) DO UPDATE SET last_id = MAX(last_id, excluded.last_id), updated_at = excluded.updated_at",
+            (payload['tipo_pauta'], payload['last_id'], payload['updated_at']),
+        )
+    else:
+        logger.warning(f"Réplica: tipo de entrada desconocido '{kind}', se ignora")
+
+def _store_meta(conn, key, default):
+    row = conn.execute("SELECT value FROM store_meta WHERE key = ?", (key,)).fetchone()
+    return row['value'] if row else default
+
+def _set_store_meta(conn, key, value):
+    conn.execute("INSERT INTO store_meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value", (key, str(value)))
+
+_results_sync_lock = threading.Lock()
+
+def sync_results_log(block_ms=None, count=500):
+    """
+    Aplica a la copia local las entradas del stream posteriores a la última aplicada y
+    devuelve cuántas. La lectura y el avance del offset van en una transacción IMMEDIATE,
+    así que varios procesos que comparten el mismo archivo no aplican en desorden.
+    """
+    queue = get_job_queue()
+    if queue is None:
+        return 0
+    with closing(connect_results_db()) as conn:
+        offset = _store_meta(conn, 'results_log_id', '0')
+    if block_ms and not queue.xread({RESULTS_LOG_KEY: offset}, count=1, block=block_ms):
+        return 0
+    applied = 0
+    with _results_sync_lock, closing(connect_results_db()) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            offset = _store_meta(conn, 'results_log_id', '0')
+            for _, entries in queue.xread({RESULTS_LOG_KEY: offset}, count=count) or []:
+                for entry_id, fields in entries:
+                    try:
+                        _apply_store_change(conn, fields[b'kind'].decode(), json.loads(gzip.decompress(fields[b'payload'])))
+                    except Exception as e:
+                        logger.exception(f"Réplica: no se pudo aplicar la entrada {entry_id!r}: {e}")
+                    offset = entry_id.decode() if isinstance(entry_id, bytes) else entry_id
+                    applied += 1
+            if applied:
+                _set_store_meta(conn, 'results_log_id', offset)
+                _set_store_meta(conn, 'results_log_applied', int(_store_meta(conn, 'results_log_applied', '0')) + applied)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return applied
+
+def results_log_gap():
+    """
+    True si el stream ya recortó (RESULTS_LOG_MAXLEN) entradas que esta copia nunca aplicó:
+    se perdieron y la copia no se puede poner al día sola. Compara las entradas aplicadas
+    con las recortadas (entries-added - length, Redis >= 7).
+    """
+    queue = get_job_queue()
+    with closing(connect_results_db()) as conn:
+        applied = int(_store_meta(conn, 'results_log_applied', '0'))
+    try:
+        info = queue.xinfo_stream(RESULTS_LOG_KEY)
+    except Exception:
+        return False  # el stream aún no existe
+    if 'entries-added' not in info:
+        logger.warning("Redis < 7: no se puede comprobar si la copia local del almacén tiene huecos")
+        return False
+    return info['entries-added'] - info['length'] > applied
+
+def results_replication_loop():
+    while True:
+        try:
+            sync_results_log(block_ms=5000)
+        except Exception as e:
+            logger.warning(f"Réplica del almacén: error leyendo {RESULTS_LOG_KEY}: {e}")
+            time.sleep(1)
+
+def start_results_replication():
+    """
+    Con PIPELINE_JOB_QUEUE pone al día la copia local del almacén y arranca el hilo que
+    aplica las escrituras de los demás nodos. Devuelve False (no arrancar) si Redis no
+    responde o si la copia local tiene un hueco que el stream ya no cubre.
+    """
+    if get_job_queue() is None:
+        return True
+    try:
+        if results_log_gap():
+            logger.error(f"{RESULTS_DB_PATH} está más atrás de lo que conserva {RESULTS_LOG_KEY} (RESULTS_LOG_MAXLEN={RESULTS_LOG_MAXLEN}); "
+                         "copia results.db de otro nodo antes de arrancar.")
+            return False
+        applied = sync_results_log()
+        while applied:
+            applied = sync_results_log()
+    except Exception as e:
+        logger.error(f"No se pudo sincronizar el almacén de resultados desde Redis: {e}")
+        return False
+    socketio.start_background_task(results_replication_loop)
+    logger.info(f"Réplica del almacén activa: {RESULTS_DB_PATH} <- {RESULTS_LOG_KEY}")
+    return True
+
+def save_result(data, result, catalog_hash=None):
+    """
+    Guarda el resultado completo; la transcripción se almacena comprimida con gzip.
+    catalog_hash identifica el catálogo de palabras clave usado (ver rematch_stored_results).
+    Devuelve el result_id.
+    """
+    audio = result.get('audio_normalizacion') or {}
+    row = {
+        'id': uuid.uuid4().hex,
+        'tipo_pauta': data.get('tipo_pauta'),
+        'id_pauta': str(data['id_pauta']) if data.get('id_pauta') is not None else None,
+        'youtube_url': data.get('youtube_url'),
+        'created_at': datetime.utcnow().isoformat(),
+        'titular': result.get('titular'),
+        'resumen': result.get('resumen'),
+        'temas': json.dumps(result.get('temas') or [], ensure_ascii=False),
+        'entidades': json.dumps(result.get('entidades') or {}, ensure_ascii=False),
+        'coincidencias': json.dumps(result.get('coincidencias') or [], ensure_ascii=False),
+        'transcripcion_gz': gzip.compress((result.get('transcripcion') or "").encode('utf-8')),
+        'catalog_hash': catalog_hash,
+        'audio_profile': audio.get('profile'),
+        'audio_original_bytes': audio.get('original_bytes'),
+        'audio_normalized_bytes': audio.get('normalized_bytes'),
+    }
+    with closing(connect_results_db()) as conn, conn:
+        conn.execute(f"INSERT INTO resultados ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})", tuple(row.values()))
+    publish_store_change('result', dict(row, transcripcion_gz=base64.b64encode(row['transcripcion_gz']).decode('ascii')))
+    return row['id']
+
+def _row_to_result(row, include_transcript=False):
+    result = {
+        'result_id': row['id'],
+        'tipo_pauta': row['tipo_pauta'],
+        'id_pauta': row['id_pauta'],
+        'youtube_url': row['youtube_url'],
+        'created_at': row['created_at'],
+        'titular': row['titular'],
+        'resumen': row['resumen'],
+        'temas': json.loads(row['temas'] or '[]'),
+        'entidades': json.loads(row['entidades'] or '{}'),
+        'coincidencias': json.loads(row['coincidencias'] or '[]'),
+    }
+    if 'audio_original_bytes' in row.keys() and row['audio_original_bytes'] is not None:
+        result['audio_normalizacion'] = {
+            'profile': row['audio_profile'],
+            'original_bytes': row['audio_original_bytes'],
+            'normalized_bytes': row['audio_normalized_bytes'],
+            'bytes_saved': row['audio_original_bytes'] - row['audio_normalized_bytes'],
+        }
+    if include_transcript:
+        result['transcripcion'] = gzip.decompress(row['transcripcion_gz']).decode('utf-8') if row['transcripcion_gz'] else ""
+    return result
+
+def load_result(result_id, include_transcript=False):
+    with closing(connect_results_db()) as conn:
+        row = conn.execute("SELECT * FROM resultados WHERE id = ?", (result_id,)).fetchone()
+    if row is None and get_job_queue() is not None and sync_results_log():
+        # Recién guardado en otro nodo y aún no replicado: se aplica el stream y se reintenta
+        with closing(connect_results_db()) as conn:
+            row = conn.execute("SELECT * FROM resultados WHERE id = ?", (result_id,)).fetchone()
+    return _row_to_result(row, include_transcript) if row else None
+
+def find_result_by_pauta(tipo_pauta, id_pauta):
+    """Último resultado almacenado para una pauta (con transcripción) o None."""
+    with closing(connect_results_db()) as conn:
+        row = conn.execute(
+            "SELECT * FROM resultados WHERE tipo_pauta = ? AND id_pauta = ? ORDER BY created_at DESC LIMIT 1",
+            (tipo_pauta, str(id_pauta)),
+        ).fetchone()
+    return _row_to_result(row, include_transcript=True) if row else None
+
+def audio_normalization_totals(desde=None, hasta=None):
+    """Totales de la normalización de audio por perfil en los resultados guardados."""
+    sql = ("SELECT audio_profile, COUNT(*) AS files, SUM(audio_normalized_bytes < audio_original_bytes) AS files_normalized, "
+           "SUM(audio_original_bytes) AS original_bytes, SUM(audio_normalized_bytes) AS normalized_bytes "
+           "FROM resultados WHERE audio_original_bytes IS NOT NULL")
+    params = []
+    if desde:
+        sql += " AND created_at >= ?"
+        params.append(desde)
+    if hasta:
+        sql += " AND created_at < ?"
+        params.append((datetime.strptime(hasta, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d"))
+    sql += " GROUP BY audio_profile"
+    totals = {'profile': TRANSCRIPTION_AUDIO_PROFILE, 'files': 0, 'files_normalized': 0, 'original_bytes': 0, 'normalized_bytes': 0, 'por_perfil': {}}
+    with closing(connect_results_db()) as conn:
+        for row in conn.execute(sql, params):
+            stats = {k: row[k] or 0 for k in ('files', 'files_normalized', 'original_bytes', 'normalized_bytes')}
+            stats['bytes_saved'] = stats['original_bytes'] - stats['normalized_bytes']
+            totals['por_perfil'][row['audio_profile']] = stats
+            for k in ('files', 'files_normalized', 'original_bytes', 'normalized_bytes'):
+                totals[k] += stats[k]
+    totals['bytes_saved'] = totals['original_bytes'] - totals['normalized_bytes']
+    return totals
+
+JOB_TRACE_KEY = "notiexpress:job_trace:{}"
+
+def save_job_trace(job):
+    trace_gz = gzip.compress(json.dumps(job.trace.to_chrome()).encode('utf-8'))
+    try:
+        with closing(connect_results_db()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO job_traces (job_id, created_at, trace_gz) VALUES (?, ?, ?)",
+                (job.job_id, job.trace.started_at, trace_gz),
+            )
+    except sqlite3.Error as e:
+        logger.warning(f"No se pudo guardar la traza del job {job.job_id}: {e}")
+    queue = get_job_queue()
+    if queue is not None:
+        try:
+            queue.set(JOB_TRACE_KEY.format(job.job_id), trace_gz, ex=JOB_TRACE_TTL)
+        except Exception as e:
+            logger.warning(f"No se pudo publicar la traza del job {job.job_id} en Redis: {e}")
+
+def load_job_trace(job_id):
+    """Traza terminada desde el almacén local o, en modo worker, desde Redis. None si no existe."""
+    with closing(connect_results_db()) as conn:
+        row = conn.execute("SELECT trace_gz FROM job_traces WHERE job_id = ?", (job_id,)).fetchone()
+    trace_gz = row['trace_gz'] if row else None
+    queue = get_job_queue()
+    if trace_gz is None and queue is not None:
+        try:
+            trace_gz = queue.get(JOB_TRACE_KEY.format(job_id))
+        except Exception as e:
+            logger.warning(f"No se pudo leer la traza del job {job_id} desde Redis: {e}")
+    return json.loads(gzip.decompress(trace_gz)) if trace_gz else None
+
+def get_preingest_watermark(tipo_pauta):
+    with closing(connect_results_db()) as conn:
+        row = conn.execute("SELECT last_id FROM preingest_watermarks WHERE tipo_pauta = ?", (tipo_pauta,)).fetchone()
+    return row['last_id'] if row else None
+
+def set_preingest_watermark(tipo_pauta, last_id):
+    updated_at = datetime.utcnow().isoformat()
+    with closing(connect_results_db()) as conn, conn:
+        conn.execute(
+            "INSERT INTO preingest_watermarks (tipo_pauta, last_id, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(tipo_pauta) DO UPDATE SET last_id = excluded.last_id, updated_at = excluded.updated_at",
+            (tipo_pauta, last_id, updated_at),
+        )
+    publish_store_change('watermark', {'tipo_pauta': tipo_pauta, 'last_id': last_id, 'updated_at': updated_at})
+
+def iter_results(desde=None, hasta=None):
+    """
+    Recorre los resultados (sin transcripción) por fecha de creación, fila a fila desde
+    el cursor de SQLite. desde/hasta: 'YYYY-MM-DD' inclusivos (UTC).
+    """
+    sql = "SELECT id, tipo_pauta, id_pauta, youtube_url, created_at, titular, resumen, temas, entidades, coincidencias, NULL AS transcripcion_gz FROM resultados WHERE 1 = 1"
+    params = []
+    if desde:
+        sql += " AND created_at >= ?"
+        params.append(desde)
+    if hasta:
+        sql += " AND created_at < ?"
+        params.append((datetime.strptime(hasta, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d"))
+    sql += " ORDER BY created_at"
+    with closing(connect_results_db()) as conn:
+        for row in conn.execute(sql, params):
+            yield _row_to_result(row)
+
+def catalog_fingerprint(palabras_clave):
+    """Hash del catálogo (clientes y palabras clave; los emails no afectan las coincidencias)."""
+    canonical = {cliente: sorted(info['palabras']) for cliente, info in palabras_clave.items()}
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def snapshot_keyword_catalog(palabras_clave):
+    """Guarda el catálogo si es una versión nueva y devuelve su hash."""
+    catalog_hash = catalog_fingerprint(palabras_clave)
+    entry = {'hash': catalog_hash, 'created_at': datetime.utcnow().isoformat(), 'catalog': json.dumps(palabras_clave, ensure_ascii=False)}
+    with closing(connect_results_db()) as conn, conn:
+        inserted = conn.execute(
+            "INSERT OR IGNORE INTO keyword_catalogs (hash, created_at, catalog) VALUES (?, ?, ?)",
+            (entry['hash'], entry['created_at'], entry['catalog']),
+        ).rowcount
+    if inserted:
+        publish_store_change('catalog', entry)
+    return catalog_hash
+
+def load_keyword_catalog(catalog_hash):
+    with closing(connect_results_db()) as conn:
+        row = conn.execute("SELECT catalog FROM keyword_catalogs WHERE hash = ?", (catalog_hash,)).fetchone()
+    return json.loads(row['catalog']) if row else None
+
+def iter_results_for_rematch(current_hash, desde=None, hasta=None):
+    """Resultados (con transcripción) cuyas coincidencias se calcularon con otro catálogo."""
+    sql = "SELECT * FROM resultados WHERE (catalog_hash IS NULL OR catalog_hash != ?)"
+    params = [current_hash]
+    if desde:
+        sql += " AND created_at >= ?"
+        params.append(desde)
+    if hasta:
+        sql += " AND created_at < ?"
+        params.append((datetime.strptime(hasta, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d"))
+    sql += " ORDER BY created_at"
+    with closing(connect_results_db()) as conn:
+        for row in conn.execute(sql, params):
+            result = _row_to_result(row, include_transcript=True)
+            result['catalog_hash'] = row['catalog_hash']
+            yield result
+
+def compact_result(result, result_id):
+    """Versión ligera para 'processing_done': sin transcripción ni entidades."""
+    return {
+        'result_id': result_id,
+        'compact': True,
+        'titular': result.get('titular'),
+        'resumen': result.get('resumen'),
+        'temas': result.get('temas'),
+        'coincidencias': result.get('coincidencias'),
+    }
+
 # -------------------------
 # Processing pipeline (central)
 # -------------------------
-def process_audio_pipeline(mp3_path, sid=None):
+def emit_result(result, sid, data):
+    """Emite 'processing_done' completo o compacto según data['compact'] / COMPACT_RESULTS."""
+    if not sid:
+        return
+    compact = data.get('compact', COMPACT_RESULTS)
+    if compact and result.get('result_id'):
+        socketio.emit('processing_done', compact_result(result, result['result_id']), to=sid)
+    else:
+        socketio.emit('processing_done', result, to=sid)
+
+def serve_stored_result(stored, sid, data):
+    """
+    Entrega un resultado pre-procesado. Las coincidencias se recalculan con el catálogo
+    actual porque es barato y el Excel puede haber cambiado desde que se procesó.
+    """
+    result = {
+        'titular': stored['titular'],
+        'resumen': stored['resumen'],
+        'entidades': stored['entidades'],
+        'temas': stored['temas'],
+        'transcripcion': stored['transcripcion'],
+        'coincidencias': verificar_palabras_clave(stored['transcripcion'], stored['entidades'], stored['temas'], cargar_palabras_clave_excel()),
+        'result_id': stored['result_id'],
+    }
+    emit_result(result, sid, data)
+    return result
+
+def process_audio_pipeline(mp3_path, sid=None, data=None):
     """
     Dado un mp3 local:
+    - normaliza el audio al perfil de transcripción (mono 16 kHz)
     - transcribe con Deepgram
     - extrae entidades
     - clasifica
     - resume y genera titular con GPT si está disponible
+    - guarda el resultado y lo emite completo o compacto (data['compact'] / COMPACT_RESULTS)
     - devuelve un dict con resultados
     """
+    data = data or {}
     try:
+        raise_if_cancelled()
+        if sid:
+            socketio.emit('progress', {'progress': 45, 'message': 'Optimizando audio para transcripción...'}, to=sid)
+        upload_path, content_type, audio_stats = normalize_audio_for_transcription(mp3_path)
+
         if sid:
             socketio.emit('progress', {'progress': 50, 'message': 'Transcribiendo audio...'}, to=sid)
-        transcription = transcribe_audio_with_deepgram(mp3_path)
+        try:
+            transcription = transcribe_audio_with_deepgram(upload_path, content_type=content_type)
+        finally:
+            if upload_path != mp3_path and os.path.exists(upload_path):
+                os.remove(upload_path)
+        raise_if_cancelled()
         if not transcription:
             raise ValueError("Transcripción vacía o falló")
 
@@ -614,12 +2267,18 @@ def process_audio_pipeline(mp3_path, sid=None):
             socketio.emit('progress', {'progress': 65, 'message': 'Analizando texto...'}, to=sid)
 
         entities = extract_entities(transcription)
+        raise_if_cancelled()
         themes = classify_theme(transcription)
+        raise_if_cancelled()
         summary = summarize_text_with_gpt(transcription)
+        raise_if_cancelled()
         titular = generar_titular_con_gpt(transcription)
+        raise_if_cancelled()
 
-        palabras_clave = cargar_palabras_clave_excel()
-        coincidencias = verificar_palabras_clave(transcription, entities, themes, palabras_clave)
+        with trace_span("keyword_matching") as span:
+            palabras_clave = cargar_palabras_clave_excel()
+            coincidencias = verificar_palabras_clave(transcription, entities, themes, palabras_clave)
+            span['coincidencias'] = len(coincidencias)
 
         result = {
             'titular': titular,
@@ -627,13 +2286,22 @@ def process_audio_pipeline(mp3_path, sid=None):
             'entidades': entities,        # ← Cambio aquí
             'temas': themes,              # ← Cambio aquí
             'transcripcion': transcription, # ← Cambio aquí
-            'coincidencias': coincidencias
+            'coincidencias': coincidencias,
+            'audio_normalizacion': audio_stats,
         }
 
-        if sid:
-            socketio.emit('processing_done', result, to=sid)
-
+        try:
+            with trace_span("save_result"):
+                result['result_id'] = save_result(data, result, catalog_hash=snapshot_keyword_catalog(palabras_clave))
+        except sqlite3.Error as e:
+            logger.exception(f"No se pudo guardar el resultado: {e}")
+            result['result_id'] = None
+
+        dispatch_alerts(coincidencias, palabras_clave, result, data)
+        emit_result(result, sid, data)
         return result
+    except JobCancelled:
+        raise
     except Exception as e:
         logger.exception(f"process_audio_pipeline error: {e}")
         if sid:
@@ -648,18 +2316,19 @@ def get_pauta_audio_file(id_pauta, tipo_pauta):
     Descarga y devuelve la ruta del mp3 (local) o None.
     """
     try:
-        conn = connect_to_db()
-        if not conn:
-            raise ConnectionError("No se pudo conectar a la base de datos")
-        cursor = conn.cursor()
-        if tipo_pauta == 'tv':
-            record = fetch_record_by_id_pauta_tv(cursor, id_pauta)
-        elif tipo_pauta == 'radio':
-            record = fetch_record_by_id_pauta_radio(cursor, id_pauta)
-        else:
-            record = None
-        cursor.close()
-        conn.close()
+        with trace_span("db_lookup", tipo_pauta=tipo_pauta, id_pauta=id_pauta):
+            conn = connect_to_db()
+            if not conn:
+                raise ConnectionError("No se pudo conectar a la base de datos")
+            cursor = conn.cursor()
+            if tipo_pauta == 'tv':
+                record = fetch_record_by_id_pauta_tv(cursor, id_pauta)
+            elif tipo_pauta == 'radio':
+                record = fetch_record_by_id_pauta_radio(cursor, id_pauta)
+            else:
+                record = None
+            cursor.close()
+            conn.close()
         if not record:
             raise ValueError("Registro no encontrado en DB")
         if tipo_pauta == 'tv':
@@ -667,7 +2336,10 @@ def get_pauta_audio_file(id_pauta, tipo_pauta):
             mp4_tmp = os.path.join(DOWNLOAD_FOLDER, f"{id_pauta}.mp4")
             mp3_tmp = os.path.join(DOWNLOAD_FOLDER, f"{id_pauta}.mp3")
             if download_file(url, mp4_tmp):
-                if convert_mp4_to_mp3(mp4_tmp, mp3_tmp):
+                raise_if_cancelled()
+                with trace_span("convert_mp4_to_mp3", bytes=os.path.getsize(mp4_tmp)):
+                    converted = convert_mp4_to_mp3(mp4_tmp, mp3_tmp)
+                if converted:
                     os.remove(mp4_tmp)
                     return mp3_tmp
                 else:
@@ -681,6 +2353,12 @@ def get_pauta_audio_file(id_pauta, tipo_pauta):
                 return mp3_tmp
             else:
                 raise ValueError("Error descargando MP3")
+    except JobCancelled:
+        for leftover in (f"{id_pauta}.mp4", f"{id_pauta}.mp3"):
+            path = os.path.join(DOWNLOAD_FOLDER, leftover)
+            if os.path.exists(path):
+                os.remove(path)
+        raise
     except Exception as e:
         logger.exception(f"get_pauta_audio_file failed: {e}")
         return None
@@ -696,26 +2374,338 @@ def health_check():
     logger.info("Health route accessed")
     return {"status": "Backend running", "cors": "OK", "port": 5001}
 
+# -------------------------
+# Resultados almacenados (entrega paginada de la transcripción)
+# -------------------------
+def compressed_json_response(payload, status=200):
+    """JSON comprimido con gzip si el cliente lo acepta y vale la pena."""
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    resp = app.response_class(body, status=status, mimetype='application/json')
+    resp.headers['Vary'] = 'Accept-Encoding'
+    if len(body) > 1024 and 'gzip' in request.headers.get('Accept-Encoding', ''):
+        resp.set_data(gzip.compress(body))
+        resp.headers['Content-Encoding'] = 'gzip'
+    return resp
+
+def require_clerk_auth(view):
+    """
+    Exige 'Authorization: Bearer <clerk_jwt>' cuando AUTH_REQUIRED, igual que el connect del socket.
+    Los claims quedan en g.clerk_claims (None si no se exige autenticación).
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.clerk_claims = None
+        if AUTH_REQUIRED:
+            auth_header = request.headers.get('Authorization', '')
+            claims = verify_clerk_session(auth_header[7:]) if auth_header.startswith('Bearer ') else None
+            if claims is None:
+                return jsonify({"error": "No autorizado"}), 401
+            g.clerk_claims = claims
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.route('/stats/audio-normalization')
+@require_clerk_auth
+def get_audio_normalization_stats():
+    """
+    Bytes ahorrados por la normalización de audio, sumados desde los resultados guardados
+    (los escriban este proceso o los workers): ?desde=YYYY-MM-DD&hasta=YYYY-MM-DD.
+    """
+    desde = request.args.get('desde')
+    hasta = request.args.get('hasta')
+    try:
+        for value in (desde, hasta):
+            if value:
+                datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        return jsonify({"error": "desde y hasta deben tener formato YYYY-MM-DD"}), 400
+    return jsonify(audio_normalization_totals(desde, hasta))
+
+@app.route('/results/<result_id>')
+@require_clerk_auth
+def get_result(result_id):
+    """Resultado almacenado sin la transcripción (ver /results/<id>/transcript)."""
+    result = load_result(result_id)
+    if not result:
+        return jsonify({"error": "Resultado no encontrado"}), 404
+    return compressed_json_response(result)
+
+@app.route('/results/<result_id>/transcript')
+@require_clerk_auth
+def get_result_transcript(result_id):
+    """
+    Transcripción paginada por caracteres: ?page=1&page_size=20000.
+    """
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+        page_size = min(max(int(request.args.get('page_size', TRANSCRIPT_PAGE_SIZE)), 1), TRANSCRIPT_PAGE_SIZE * 10)
+    except ValueError:
+        return jsonify({"error": "page y page_size deben ser enteros"}), 400
+    result = load_result(result_id, include_transcript=True)
+    if not result:
+        return jsonify({"error": "Resultado no encontrado"}), 404
+    text = result['transcripcion']
+    total_pages = max(math.ceil(len(text) / page_size), 1)
+    start = (page - 1) * page_size
+    return compressed_json_response({
+        'result_id': result_id,
+        'page': page,
+        'page_size': page_size,
+        'total_pages': total_pages,
+        'total_chars': len(text),
+        'text': text[start:start + page_size],
+    })
+
+@app.route('/rematch', methods=['POST'])
+@require_clerk_auth
+def rematch_results():
+    """
+    Re-match incremental tras cambiar queries_av_3.0.xlsx: ?desde=YYYY-MM-DD&hasta=YYYY-MM-DD.
+    Se ejecuta en segundo plano (carril batch); responde 202 con job_id y el resultado
+    (solo las coincidencias nuevas, también enviadas como alertas si hay SMTP) se consulta
+    en GET /rematch/<job_id>.
+    """
+    desde = request.args.get('desde')
+    hasta = request.args.get('hasta')
+    try:
+        for value in (desde, hasta):
+            if value:
+                datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        return jsonify({"error": "desde y hasta deben tener formato YYYY-MM-DD"}), 400
+    run_id, created = submit_rematch_job(desde, hasta, user=(g.clerk_claims or {}).get('sub') or 'http')
+    return jsonify({"status": "queued" if created else "already_running", "job_id": run_id}), 202
+
+@app.route('/rematch/<job_id>')
+@require_clerk_auth
+def get_rematch_run(job_id):
+    """Estado del re-match (queued/running/done/error) y, al terminar, sus coincidencias nuevas."""
+    run = load_rematch_run(job_id)
+    if run is None:
+        return jsonify({"error": "Re-match no encontrado"}), 404
+    return compressed_json_response(run)
+
+# -------------------------
+# Exportación a Excel
+# -------------------------
+EXPORT_COLUMNS = ["Fecha (UTC)", "Tipo", "Pauta / URL", "Titular", "Resumen", "Temas", "Entidades", "Cliente", "Palabras clave", "Tipo coincidencia", "Result ID"]
+
+def _excel_text(value):
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+    return ILLEGAL_CHARACTERS_RE.sub("", value)[:32767] if isinstance(value, str) else value
+
+def export_rows(desde=None, hasta=None, cliente=None):
+    """Una fila por resultado y cliente con coincidencias (o una sin cliente si no hubo)."""
+    for r in iter_results(desde, hasta):
+        base = [
+            r['created_at'][:19].replace('T', ' '),
+            r['tipo_pauta'],
+            r['id_pauta'] or r['youtube_url'],
+            r['titular'],
+            r['resumen'],
+            ", ".join(r['temas']),
+            " | ".join(f"{cat}: {', '.join(items)}" for cat, items in r['entidades'].items() if items),
+        ]
+        por_cliente = {}
+        for c in r['coincidencias']:
+            por_cliente.setdefault(c['cliente'], []).append(c)
+        if cliente:
+            por_cliente = {k: v for k, v in por_cliente.items() if k == cliente}
+            if not por_cliente:
+                continue
+        if not por_cliente:
+            yield base + [None, None, None, r['result_id']]
+            continue
+        for nombre, matches in por_cliente.items():
+            yield base + [
+                nombre,
+                ", ".join(m['palabra_clave'] for m in matches),
+                ", ".join(sorted({m['tipo'] for m in matches})),
+                r['result_id'],
+            ]
+
+@app.route('/export.xlsx')
+@require_clerk_auth
+def export_results_xlsx():
+    """
+    Exporta los resultados almacenados: ?desde=YYYY-MM-DD&hasta=YYYY-MM-DD&cliente=...
+    openpyxl en modo write-only escribe las filas a disco a medida que llegan, así que la
+    memoria no crece con el número de filas; el archivo se envía por bloques y se borra.
+    """
+    import openpyxl
+    desde = request.args.get('desde')
+    hasta = request.args.get('hasta')
+    cliente = request.args.get('cliente')
+    try:
+        for value in (desde, hasta):
+            if value:
+                datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        return jsonify({"error": "desde y hasta deben tener formato YYYY-MM-DD"}), 400
+
+    sync_results_log()
+    tmp = tempfile.NamedTemporaryFile(suffix='.xlsx', dir=DOWNLOAD_FOLDER, delete=False)
+    tmp.close()
+    try:
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet("Resultados")
+        ws.append(EXPORT_COLUMNS)
+        count = 0
+        for row in export_rows(desde, hasta, cliente):
+            ws.append([_excel_text(v) for v in row])
+            count += 1
+        wb.save(tmp.name)
+        logger.info(f"Export {desde}..{hasta} cliente={cliente}: {count} filas")
+    except Exception:
+        os.remove(tmp.name)
+        raise
+
+    def stream_file(path, chunk_size=64 * 1024):
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def remove_export():
+        try:
+            os.remove(tmp.name)
+        except FileNotFoundError:
+            pass
+
+    filename = f"resultados_{desde or 'inicio'}_{hasta or 'hoy'}.xlsx"
+    resp = app.response_class(
+        stream_file(tmp.name),
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'Content-Length': str(os.path.getsize(tmp.name)),
+        },
+    )
+    # Se borra al cerrar la respuesta, aunque el cliente corte antes de empezar a leer
+    resp.call_on_close(remove_export)
+    return resp
+
 # -------------------------
 # Socket auth helper
 # -------------------------
-def verify_clerk_token(token):
+class JWKSCache:
     """
-    Intenta verificar token con Clerk SDK (si está disponible).
-    Si Clerk no está configurado o falla la verificación, devuelve False.
+    Claves públicas del JWKS en memoria. Se renuevan al vencer el TTL o cuando llega
+    un 'kid' desconocido (rotación), como máximo una vez cada min_refresh_interval.
+    Si la descarga falla se siguen usando las claves anteriores.
+    """
+
+    def __init__(self, url, ttl=3600, min_refresh_interval=30):
+        self.url = url
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self._keys = {}
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        headers = {}
+        # La API de backend de Clerk exige la secret key; a otros hosts no se la enviamos
+        if CLERK_SECRET_KEY and self.url.startswith("https://api.clerk.com/"):
+            headers["Authorization"] = f"Bearer {CLERK_SECRET_KEY}"
+        self._fetched_at = time.monotonic()
+        try:
+            r = requests.get(self.url, headers=headers, timeout=5)
+            r.raise_for_status()
+            keys = {}
+            for jwk in r.json().get('keys', []):
+                try:
+                    keys[jwk.get('kid')] = jwt.PyJWK(jwk).key
+                except Exception as e:
+                    logger.warning(f"JWKS: clave ignorada kid={jwk.get('kid')}: {e}")
+            self._keys = keys
+            logger.info(f"JWKS actualizado desde {self.url}: {len(keys)} claves")
+        except Exception as e:
+            logger.warning(f"JWKS: no se pudo actualizar desde {self.url}: {e}")
+
+    def get_key(self, kid):
+        with self._lock:
+            age = time.monotonic() - self._fetched_at
+            if age > self.ttl or (kid not in self._keys and age > self.min_refresh_interval):
+                self._refresh()
+            return self._keys.get(kid)
+
+jwks_cache = JWKSCache(CLERK_JWKS_URL, ttl=CLERK_JWKS_TTL) if CLERK_JWKS_URL else None
+if CLERK_JWKS_URL and jwt is None:
+    logger.warning("CLERK_JWKS_URL está definida pero PyJWT no está instalado; se usará el SDK de Clerk si existe.")
+
+# token -> (claims, vence_en monotonic). Evita re-verificar en tormentas de reconexión.
+_verified_tokens = {}
+_verified_tokens_lock = threading.Lock()
+VERIFIED_TOKENS_MAX = 10000
+
+def _cache_verified_token(token, claims):
+    ttl = VERIFIED_TOKEN_TTL
+    if claims.get('exp'):
+        ttl = min(ttl, claims['exp'] - time.time())
+    if ttl <= 0:
+        return
+    now = time.monotonic()
+    with _verified_tokens_lock:
+        if len(_verified_tokens) >= VERIFIED_TOKENS_MAX:
+            for t in [t for t, (_, exp) in _verified_tokens.items() if exp <= now]:
+                del _verified_tokens[t]
+            if len(_verified_tokens) >= VERIFIED_TOKENS_MAX:
+                _verified_tokens.clear()
+        _verified_tokens[token] = (claims, now + ttl)
+
+def _verify_jwt_locally(token):
+    header = jwt.get_unverified_header(token)
+    key = jwks_cache.get_key(header.get('kid'))
+    if key is None:
+        raise ValueError(f"kid desconocido: {header.get('kid')}")
+    claims = jwt.decode(token, key=key, algorithms=["RS256"], leeway=5, options={"require": ["exp", "sub"]})
+    if CLERK_AUTHORIZED_PARTIES and claims.get('azp') and claims['azp'] not in CLERK_AUTHORIZED_PARTIES:
+        raise ValueError(f"azp no autorizado: {claims['azp']}")
+    return claims
+
+def verify_clerk_session(token):
+    """
+    Verifica el token de sesión y devuelve sus claims (con 'sub' = user_id) o None.
+    Con CLERK_JWKS_URL la firma se valida localmente contra el JWKS cacheado;
+    si no, se consulta a Clerk por red. Sin Clerk configurado se acepta (modo desarrollo);
+    con Clerk configurado pero sin forma de verificar se rechaza (ver jwks_stub.py para pruebas).
     """
     if not token:
-        return False
-    if clerk is None:
-        logger.info("Clerk SDK no disponible, omitiendo verificación del token (modo desarrollo).")
-        return True  # permitir para pruebas locales
+        return None
+    now = time.monotonic()
+    with _verified_tokens_lock:
+        cached = _verified_tokens.get(token)
+    if cached and cached[1] > now:
+        return cached[0]
     try:
-        session = clerk.sessions.verify(token)
-        logger.info(f"Clerk session verified: user_id={session.get('user_id')}")
-        return True
+        if jwks_cache is not None and jwt is not None:
+            claims = _verify_jwt_locally(token)
+        elif get_clerk() is not None:
+            session = get_clerk().sessions.verify(token)
+            claims = {'sub': session.get('user_id')}
+        elif AUTH_REQUIRED:
+            # Clerk configurado pero sin PyJWT ni SDK: se rechaza en vez de aceptar cualquier token
+            logger.error("Clerk configurado pero no hay PyJWT ni SDK de Clerk para verificar el token; se rechaza.")
+            return None
+        else:
+            logger.info("Clerk SDK no disponible, omitiendo verificación del token (modo desarrollo).")
+            return {'sub': None}  # permitir para pruebas locales
     except Exception as e:
         logger.warning(f"Clerk token verification failed: {e}")
-        return False
+        return None
+    logger.info(f"Clerk session verified: user_id={claims.get('sub')}")
+    _cache_verified_token(token, claims)
+    return claims
+
+def verify_clerk_token(token):
+    """
+    Intenta verificar token (JWKS local o Clerk SDK).
+    Si falla la verificación, devuelve False.
+    """
+    return verify_clerk_session(token) is not None
 
 # -------------------------
 # Socket.IO events
@@ -732,15 +2722,16 @@ def on_connect(auth):
         if isinstance(auth, dict):
             token = auth.get('token')
         # verificar token (si falla, se rechaza la conexión)
-        if CLERK_SECRET_KEY:
-            ok = verify_clerk_token(token)
-            if not ok:
+        if AUTH_REQUIRED:
+            claims = verify_clerk_session(token)
+            if claims is None:
                 logger.warning(f"Rejecting socket connection for sid={sid} due to invalid clerk token")
                 return False  # rechaza conexión
+            socket_users[sid] = claims.get('sub')
     except Exception as e:
         logger.exception(f"Error in connect auth: {e}")
         # para desarrollo no bloquear, pero si CLERK configurado, rechazamos
-        if CLERK_SECRET_KEY:
+        if AUTH_REQUIRED:
             return False
     # conexión aceptada
     emit('connect_ack', {'message': 'connected', 'sid': sid})
@@ -756,39 +2747,115 @@ def on_start_processing(data):
     """
     sid = request.sid
     logger.info(f"Received start_processing from sid={sid} data={data}")
-    socketio.start_background_task(target=background_task_handler, data=data, sid=sid)
+    # Sin Clerk cada conexión cuenta como un usuario distinto
+    submit_pipeline_job(data or {}, sid=sid, user=socket_users.get(sid) or sid, job_class='interactive')
+
+@socketio.on('cancel_processing')
+def on_cancel_processing(data=None):
+    """
+    Cancela los trabajos del cliente (o solo data['job_id']). Si otro cliente sigue
+    suscrito al mismo trabajo, este solo deja de recibir sus eventos.
+    """
+    sid = request.sid
+    job_id = data.get('job_id') if isinstance(data, dict) else None
+    job_ids = unsubscribe_sid(sid, job_id=job_id, reason=f"cancel_processing de sid={sid}")
+    emit('processing_cancelled', {'job_ids': job_ids})
+
+@socketio.on('disconnect')
+def on_disconnect(*args):
+    sid = request.sid
+    logger.info(f"Socket disconnected: sid={sid}")
+    socket_users.pop(sid, None)
+    unsubscribe_sid(sid, reason=f"desconexión de sid={sid}")
 
 # -------------------------
 # HTTP endpoint para iniciar (alternativa)
 # -------------------------
 @app.route("/start", methods=["POST"])
+@require_clerk_auth
 def start_via_http():
     """
     Endpoint POST para iniciar el procesamiento si no se usa socket.
-    Retorna {status: 'processing_started', sid: null}
+    Retorna {status: 'processing_started', job_id}
     """
-    payload = request.json or {}
+    payload = dict(request.json or {})
     logger.info(f"HTTP /start called with payload: {payload}")
-    # Para HTTP no tenemos sid -> usamos None pero emitaremos a todos si necesario.
-    socketio.start_background_task(target=background_task_handler, data=payload, sid=None)
-    return jsonify({"status": "processing_started"})
+    # Para HTTP no tenemos sid -> el trabajo no tiene suscriptores y no se cancela por desconexión.
+    # Siempre carril batch: el interactivo (y sus hilos reservados) es solo para clientes socket
+    payload.pop('job_class', None)
+    job = submit_pipeline_job(payload, sid=None, user=(g.clerk_claims or {}).get('sub') or 'http', job_class='batch')
+    return jsonify({"status": "processing_started", "job_id": job.job_id})
+
+@app.route("/jobs/<job_id>/trace")
+@require_clerk_auth
+def get_job_trace(job_id):
+    """
+    Traza del trabajo en formato Chrome trace-event (abrir en chrome://tracing o Perfetto).
+    Si sigue en curso en este proceso se devuelve lo registrado hasta el momento; si lo
+    ejecuta un worker, la traza está disponible cuando termina.
+    """
+    with jobs_lock:
+        job = jobs.get(job_id)
+    trace = job.trace.to_chrome() if job is not None and job.running_here else load_job_trace(job_id)
+    if trace is None:
+        if job is not None and not job.finished:
+            return jsonify({"error": "El trabajo sigue en curso en un worker; la traza estará disponible al terminar"}), 404
+        return jsonify({"error": "Traza no encontrada"}), 404
+    resp = compressed_json_response(trace)
+    resp.headers['Content-Disposition'] = f'attachment; filename="trace_{job_id}.json"'
+    return resp
+
+@app.route("/jobs/<job_id>/cancel", methods=["POST"])
+@require_clerk_auth
+def cancel_via_http(job_id):
+    """
+    Cancela el trabajo. Si este proceso no lo tiene registrado (otro proceso API o ya se
+    limpió el registro local) y hay PIPELINE_JOB_QUEUE, se marca la cancelación en Redis,
+    que es lo que consultan los workers.
+    """
+    with jobs_lock:
+        job = jobs.get(job_id)
+    if job is not None:
+        job.cancel("cancelado vía HTTP")
+        return jsonify({"status": "cancelled", "job_id": job_id})
+    queue = get_job_queue()
+    if queue is None:
+        return jsonify({"error": "Trabajo no encontrado"}), 404
+    if queue.exists(JOB_DONE_KEY.format(job_id)):
+        return jsonify({"error": "El trabajo ya terminó"}), 409
+    queue.set(JOB_CANCEL_KEY.format(job_id), "cancelado vía HTTP", ex=JOB_FLAG_TTL)
+    logger.info(f"Cancelación de {job_id} publicada en Redis (sin registro local)")
+    return jsonify({"status": "cancelled", "job_id": job_id})
 
 # -------------------------
 # Background orchestrator
 # -------------------------
-def background_task_handler(data, sid=None):
+def background_task_handler(data, sid=None, job_id=None):
     """
     Orquesta el flujo completo:
     - descarga (youtube o pauta)
     - transcribe + procesa
-    - emite progreso y resultado al sid (si existe)
+    - emite progreso y resultado al sid o sala del trabajo (si existe)
+    - se detiene entre etapas si el trabajo se cancela (ver PipelineJob)
     """
     tipo_pauta = data.get('tipo_pauta')
     id_pauta = data.get('id_pauta')
     youtube_url = data.get('youtube_url')
 
+    with jobs_lock:
+        job = jobs.get(job_id) if job_id else None
+        if job is None:
+            # Trabajo encolado desde otro proceso o pre-ingesta: se registra localmente
+            job = PipelineJob(job_id or uuid.uuid4().hex, data)
+            jobs[job.job_id] = job
+        job.running_here = True
+    _current_job.job = job
+    root_span = job.trace.begin("background_task_handler", tipo_pauta=tipo_pauta, id_pauta=id_pauta, youtube_url=youtube_url)
+
     temp_files = []
     try:
+        # Cancelado mientras esperaba en cola: se libera el hilo sin tocar la red ni la BD
+        job.raise_if_cancelled()
         logger.info(f"Starting pipeline: tipo={tipo_pauta} id={id_pauta} youtube={youtube_url} sid={sid}")
         if sid:
             socketio.emit('progress', {'progress': 5, 'message': 'Iniciando procesamiento...'}, to=sid)
@@ -839,6 +2906,16 @@ def background_task_handler(data, sid=None):
         elif tipo_pauta in ('tv', 'radio'):
             if not id_pauta:
                 raise ValueError("No se proporcionó ID de pauta")
+
+            # Resultado ya pre-procesado (ver preingest_loop) salvo que se pida reprocesar
+            if not data.get('force'):
+                with trace_span("stored_result_lookup"):
+                    stored = find_result_by_pauta(tipo_pauta, id_pauta)
+                if stored:
+                    logger.info(f"Sirviendo resultado almacenado {stored['result_id']} para {tipo_pauta} {id_pauta}")
+                    if sid:
+                        socketio.emit('progress', {'progress': 95, 'message': 'Resultado disponible (pre-procesado)'}, to=sid)
+                    return serve_stored_result(stored, sid, data)
             
             if sid:
                 socketio.emit('progress', {'progress': 10, 'message': f'Conectando con base de datos...'}, to=sid)
@@ -868,7 +2945,8 @@ def background_task_handler(data, sid=None):
         if sid:
             socketio.emit('progress', {'progress': 30, 'message': 'Audio obtenido, iniciando transcripción...'}, to=sid)
 
-        result = process_audio_pipeline(mp3_path, sid=sid)
+        raise_if_cancelled()
+        result = process_audio_pipeline(mp3_path, sid=sid, data=data)
         logger.info(f"Processing finished for sid={sid}")
 
         # cleanup temp files
@@ -882,6 +2960,19 @@ def background_task_handler(data, sid=None):
 
         return result
 
+    except JobCancelled:
+        logger.info(f"Job {job.job_id} cancelado, liberando recursos")
+        if sid:
+            socketio.emit('processing_cancelled', {'job_ids': [job.job_id]}, to=sid)
+        # cleanup temp files
+        for fpath in temp_files:
+            try:
+                if os.path.exists(fpath):
+                    os.remove(fpath)
+            except Exception:
+                logger.exception(f"Error removing temp file: {fpath}")
+        return None
+
     except ValueError as e:
         # Errores de validación - ya tienen mensajes específicos
         logger.error(f"Validation error: {e}")
@@ -910,6 +3001,109 @@ def background_task_handler(data, sid=None):
             except Exception:
                 logger.exception(f"Error removing temp file: {fpath}")
         return None
+
+    finally:
+        job.trace.end(root_span, error=None if not job.cancelled else "cancelled")
+        save_job_trace(job)
+        job.finish()
+        _current_job.job = None
+        with jobs_lock:
+            jobs.pop(job.job_id, None)
+
+# -------------------------
+# Pre-procesamiento de pautas nuevas
+# -------------------------
+def preingest_cycle():
+    """
+    Un sondeo: procesa (de a una, con pausa) hasta PREINGEST_MAX_PER_CYCLE pautas tv/radio
+    nuevas por tipo desde la marca de agua. Las que quedan fuera de PREINGEST_LOOKBACK_HOURS
+    o ya tienen resultado solo avanzan la marca y no cuentan para el tope, así que la marca
+    se pone al día aunque se haya acumulado un atraso.
+    """
+    cutoff = datetime.utcnow() - timedelta(hours=PREINGEST_LOOKBACK_HOURS)
+    for tipo_pauta in PAUTA_TABLES:
+        watermark = get_preingest_watermark(tipo_pauta)
+        processed = 0
+        while processed < PREINGEST_MAX_PER_CYCLE:
+            conn = connect_to_db()
+            if not conn:
+                logger.warning("Pre-ingesta: no se pudo conectar a la base de datos")
+                return
+            try:
+                cursor = conn.cursor()
+                records = fetch_new_pautas(cursor, tipo_pauta, watermark, PREINGEST_MAX_PER_CYCLE)
+                cursor.close()
+            finally:
+                conn.close()
+            if not records:
+                break
+
+            for record in records:
+                if processed >= PREINGEST_MAX_PER_CYCLE:
+                    break
+                id_pauta = record[0]
+                fecha = record[-1]
+                if isinstance(fecha, datetime) and fecha < cutoff:
+                    logger.debug(f"Pre-ingesta: {tipo_pauta} {id_pauta} fuera de la ventana de {PREINGEST_LOOKBACK_HOURS}h")
+                elif find_result_by_pauta(tipo_pauta, id_pauta):
+                    logger.debug(f"Pre-ingesta: {tipo_pauta} {id_pauta} ya procesada")
+                else:
+                    logger.info(f"Pre-ingesta: procesando {tipo_pauta} {id_pauta}")
+                    job = submit_pipeline_job({'tipo_pauta': tipo_pauta, 'id_pauta': id_pauta, 'preingest': True},
+                                              sid=None, user='preingest', job_class='preingest')
+                    # De a una: se espera a que termine (aquí o en un worker) antes de la siguiente
+                    while not job.finished and not job.cancelled:
+                        hold_preingest_lease()
+                        time.sleep(2)
+                    processed += 1
+                    time.sleep(PREINGEST_DELAY)
+                # Se avanza aunque falle: la petición interactiva reintentará esa pauta
+                set_preingest_watermark(tipo_pauta, id_pauta)
+                watermark = id_pauta
+
+PREINGEST_LEASE_KEY = "notiexpress:preingest_leader"
+PREINGEST_LEASE_TTL = max(PREINGEST_INTERVAL * 2, 60)
+_preingest_owner = uuid.uuid4().hex
+
+def hold_preingest_lease():
+    """
+    Con PIPELINE_JOB_QUEUE todos los workers arrancan el sondeo, pero solo sondea el que
+    tiene la clave de líder en Redis (se renueva mientras sigue vivo). Sin Redis: True.
+    """
+    queue = get_job_queue()
+    if queue is None:
+        return True
+    try:
+        if queue.set(PREINGEST_LEASE_KEY, _preingest_owner, nx=True, ex=PREINGEST_LEASE_TTL):
+            return True
+        if queue.get(PREINGEST_LEASE_KEY) == _preingest_owner.encode():
+            queue.expire(PREINGEST_LEASE_KEY, PREINGEST_LEASE_TTL)
+            return True
+    except Exception as e:
+        logger.warning(f"Pre-ingesta: no se pudo consultar el líder en Redis: {e}")
+    return False
+
+def preingest_loop():
+    logger.info(f"Pre-ingesta activa: cada {PREINGEST_INTERVAL}s, ventana {PREINGEST_LOOKBACK_HOURS}h, máx {PREINGEST_MAX_PER_CYCLE} por tipo")
+    while True:
+        try:
+            if hold_preingest_lease():
+                preingest_cycle()
+            else:
+                logger.debug("Pre-ingesta: otro proceso es el líder, se omite el sondeo")
+        except Exception as e:
+            logger.exception(f"Pre-ingesta: error en el sondeo: {e}")
+        time.sleep(PREINGEST_INTERVAL)
+
+def start_preingest_scheduler():
+    """
+    Arranca el sondeo en segundo plano (PREINGEST_ENABLED). Sin Redis debe activarse en un
+    solo proceso; con PIPELINE_JOB_QUEUE los workers lo arrancan y se elige un líder.
+    """
+    if not PREINGEST_ENABLED:
+        return
+    socketio.start_background_task(preingest_loop)
+
 # -------------------------
 # Run
 # -------------------------
@@ -922,6 +3116,13 @@ if __name__ == "__main__":
         print(f"Ruta: {rule.rule} -> {rule.endpoint}")
     print("========================")
     
-    # Volver al puerto 5000 por simplicidad
-    logger.info("Starting Flask + SocketIO server on localhost:5000")
-    socketio.run(app, host="localhost", port=5000, debug=True)
+    # Con debug=True el reloader de Werkzeug ejecuta este bloque en el proceso padre y en el
+    # hijo que sirve; solo el hijo (WERKZEUG_RUN_MAIN) sondea, si no cada pauta se procesa dos veces
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        if not start_results_replication():
+            sys.exit(1)
+        start_preingest_scheduler()
+
+    # Varios procesos en la misma máquina: usar PORT distinto en cada uno (con sticky sessions en el balanceador)
+    logger.info(f"Starting Flask + SocketIO server on localhost:{PORT}")
+    socketio.run(app, host="localhost", port=PORT, debug=True)
@@ -0,0 +1,119 @@
+# jwks_stub.py
+"""
+JWKS de prueba para verificar tokens de sesión sin Clerk.
+- Genera un par RSA en memoria y publica la clave pública en /.well-known/jwks.json
+- Firma tokens RS256 con 'sub', 'exp' y 'azp' como los de Clerk
+- --check verifica app.verify_clerk_session contra el stub (válido, vencido, otra clave, rotación)
+
+Uso:
+    python jwks_stub.py --sub user_test            # sirve el JWKS e imprime un token
+    CLERK_JWKS_URL=http://localhost:8765/.well-known/jwks.json python app.py
+    python jwks_stub.py --check                    # exit 1 si alguna verificación falla
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+
+class StubKey:
+    def __init__(self):
+        self.kid = uuid.uuid4().hex[:16]
+        self.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    def jwk(self):
+        jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(self.private_key.public_key()))
+        jwk.update({'kid': self.kid, 'use': 'sig', 'alg': 'RS256'})
+        return jwk
+
+    def token(self, sub, ttl=300, azp=None):
+        now = int(time.time())
+        claims = {'sub': sub, 'iat': now, 'exp': now + ttl}
+        if azp:
+            claims['azp'] = azp
+        return jwt.encode(claims, self.private_key, algorithm="RS256", headers={'kid': self.kid})
+
+
+class JWKSStub:
+    """Servidor HTTP en un hilo; keys se puede cambiar en caliente para simular una rotación."""
+
+    def __init__(self, port=8765):
+        self.keys = [StubKey()]
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/.well-known/jwks.json":
+                    self.send_error(404)
+                    return
+                body = json.dumps({'keys': [k.jwk() for k in stub.keys]}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("localhost", port), Handler)
+        self.url = f"http://localhost:{self.server.server_address[1]}/.well-known/jwks.json"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+
+def run_checks():
+    stub = JWKSStub(port=0).start()
+    os.environ["CLERK_JWKS_URL"] = stub.url
+    os.environ.setdefault("RESULTS_DB_PATH", os.path.join(tempfile.gettempdir(), "jwks_stub_results.db"))
+    import app
+
+    app.jwks_cache.min_refresh_interval = 0
+    key = stub.keys[0]
+    rotated = StubKey()
+    checks = [
+        ("token válido", lambda: (app.verify_clerk_session(key.token("user_ok")) or {}).get('sub') == "user_ok"),
+        ("token vencido", lambda: app.verify_clerk_session(key.token("user_exp", ttl=-60)) is None),
+        ("clave desconocida", lambda: app.verify_clerk_session(rotated.token("user_otro")) is None),
+        ("token vacío", lambda: app.verify_clerk_session("") is None),
+    ]
+
+    def after_rotation():
+        stub.keys = [rotated]
+        return (app.verify_clerk_session(rotated.token("user_rot")) or {}).get('sub') == "user_rot"
+    checks.append(("rotación de claves", after_rotation))
+
+    failed = 0
+    for name, check in checks:
+        ok = check()
+        failed += not ok
+        print(f"{'OK ' if ok else 'FALLA'} {name}")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--sub", default="user_test")
+    parser.add_argument("--ttl", type=int, default=3600)
+    parser.add_argument("--check", action="store_true")
+    args = parser.parse_args()
+
+    if args.check:
+        sys.exit(0 if run_checks() else 1)
+
+    stub = JWKSStub(args.port)
+    print(f"CLERK_JWKS_URL={stub.url}")
+    print(f"Token ({args.sub}, {args.ttl}s):\n{stub.keys[0].token(args.sub, ttl=args.ttl)}")
+    stub.server.serve_forever()
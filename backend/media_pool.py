@@ -0,0 +1,95 @@
+# media_pool.py
+"""
+Tareas de conversión de medios que se ejecutan en el pool de procesos (ver
+get_media_pool en app.py), fuera del proceso del servidor Socket.IO.
+- No importa app.py: los hijos (spawn) se crean con un __main__ vacío (submit_media_task
+  en app.py) para no re-ejecutar el script del servidor y cargar solo este módulo
+- La cancelación llega como un archivo marcador (cancel_path): si existe, la tarea
+  se detiene y mata su ffmpeg
+"""
+
+import os
+import sys
+import time
+import signal
+import logging
+import subprocess
+
+logger = logging.getLogger("media_pool")
+
+
+class ConversionCancelled(Exception):
+    """El archivo marcador de cancelación apareció durante la conversión."""
+
+
+def init_worker():
+    """Inicializador del pool: logging como el servidor y sin capturar Ctrl+C (lo maneja el padre)."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - [media %(process)d] %(message)s', handlers=[logging.StreamHandler(sys.stdout)])
+
+
+def _cancelled(cancel_path):
+    return bool(cancel_path) and os.path.exists(cancel_path)
+
+
+def convert_mp4_to_mp3(mp4_path, mp3_path, cancel_path=None):
+    from moviepy.editor import VideoFileClip
+    import proglog
+
+    class CancelLogger(proglog.ProgressBarLogger):
+        # moviepy lo llama en cada bloque de audio escrito
+        def bars_callback(self, bar, attr, value, old_value=None):
+            if _cancelled(cancel_path):
+                raise ConversionCancelled(mp4_path)
+
+    try:
+        with VideoFileClip(mp4_path) as video:
+            audio = video.audio
+            audio.write_audiofile(mp3_path, verbose=False, logger=CancelLogger())
+            audio.close()
+        logger.info(f"Converted {mp4_path} -> {mp3_path}")
+        return True
+    except ConversionCancelled:
+        logger.info(f"Conversión cancelada: {mp4_path}")
+        if os.path.exists(mp3_path):
+            os.remove(mp3_path)
+        return False
+    except Exception as e:
+        logger.exception(f"Error converting mp4 to mp3: {e}")
+        return False
+
+
+def run_ffmpeg_commands(commands, cwd, output_file, cancel_path=None):
+    """
+    Prueba los comandos ffmpeg en orden hasta que uno genere output_file.
+    Devuelve (éxito, intentos) con intentos = [{'method', 'seconds', 'ok', 'error'}].
+    """
+    attempts = []
+    for i, cmd in enumerate(commands):
+        if _cancelled(cancel_path):
+            break
+        logger.info(f"Intentando FFmpeg método {i+1}...")
+        start = time.monotonic()
+        proc = subprocess.Popen(cmd, shell=True, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True)
+        while True:
+            try:
+                _, stderr = proc.communicate(timeout=0.5)
+                break
+            except subprocess.TimeoutExpired:
+                if _cancelled(cancel_path):
+                    os.killpg(proc.pid, signal.SIGKILL)
+                    proc.communicate()
+                    attempts.append({'method': i + 1, 'seconds': time.monotonic() - start, 'ok': False, 'error': 'cancelled'})
+                    return False, attempts
+        ok = proc.returncode == 0 and os.path.exists(output_file) and os.path.getsize(output_file) > 0
+        attempts.append({
+            'method': i + 1,
+            'seconds': time.monotonic() - start,
+            'ok': ok,
+            'error': None if ok else stderr.decode(errors='ignore')[-2000:],
+        })
+        if ok:
+            logger.info(f"✅ FFmpeg método {i+1} exitoso")
+            return True, attempts
+        logger.warning(f"FFmpeg método {i+1} falló: {attempts[-1]['error']}")
+    return False, attempts
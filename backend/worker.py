@@ -0,0 +1,98 @@
+# worker.py
+"""
+Worker del pipeline para despliegues multi-proceso / multi-nodo.
+- Consume trabajos de las colas Redis por carril y usuario (PIPELINE_JOB_QUEUE / PIPELINE_JOB_QUEUE_KEY:<carril>)
+- Turnos entre usuarios y tope por usuario compartidos por todos los workers (en Redis)
+- Los ejecuta con el mismo planificador justo que el servidor (PIPELINE_WORKERS hilos)
+- Emite 'progress' / 'processing_done' a cualquier cliente vía SOCKETIO_MESSAGE_QUEUE
+- Precarga las dependencias pesadas del pipeline (el proceso API las evita, ver api.py)
+- Replica el almacén de resultados con los demás nodos vía Redis (ver start_results_replication)
+- Con PREINGEST_ENABLED sondea pautas nuevas (un solo worker a la vez, líder en Redis)
+
+Uso:
+    SOCKETIO_MESSAGE_QUEUE=redis://localhost:6379/0 PIPELINE_JOB_QUEUE=redis://localhost:6379/0 python worker.py
+"""
+
+import sys
+import time
+
+from app import (
+    logger,
+    background_task_handler,
+    get_job_queue,
+    get_scheduler,
+    job_queue_key,
+    pop_pipeline_job,
+    preload_pipeline_dependencies,
+    release_pipeline_job,
+    start_preingest_scheduler,
+    start_results_replication,
+    wait_for_pipeline_jobs,
+    JOB_CLASSES,
+    PIPELINE_LANE_WEIGHTS,
+    SOCKETIO_MESSAGE_QUEUE,
+)
+
+
+def feeder_loop():
+    """
+    Toma trabajos de Redis solo cuando hay hilos libres, para no acaparar trabajo que
+    otro worker podría hacer. Los carriles se atienden por peso (PIPELINE_WEIGHT_*) y,
+    dentro de cada uno, por turnos entre usuarios con el tope PIPELINE_MAX_PER_USER
+    aplicado en todo el despliegue (ver pop_pipeline_job). Batch y pre-ingesta solo se
+    toman si quedan hilos libres fuera de los reservados a interactivos.
+    """
+    scheduler = get_scheduler()
+    lane_vtime = {lane: 0.0 for lane in JOB_CLASSES}
+    logger.info(f"Worker escuchando {', '.join(job_queue_key(lane) for lane in JOB_CLASSES)}")
+    while True:
+        if not scheduler.capacity_available():
+            time.sleep(0.2)
+            continue
+        background_free = scheduler.background_capacity_available()
+        lanes = sorted((lane for lane in JOB_CLASSES if lane == 'interactive' or background_free), key=lambda l: lane_vtime[l])
+        job, empty = None, []
+        try:
+            for lane in lanes:
+                job = pop_pipeline_job(lane)
+                if job is not None:
+                    # Un carril que estuvo vacío no acumula crédito del tiempo ocioso
+                    for idle in empty:
+                        lane_vtime[idle] = max(lane_vtime[idle], lane_vtime[lane])
+                    lane_vtime[lane] += 1.0 / PIPELINE_LANE_WEIGHTS[lane]
+                    break
+                empty.append(lane)
+            if job is None:
+                wait_for_pipeline_jobs(timeout=1)
+                continue
+        except Exception as e:
+            logger.warning(f"Worker: error leyendo la cola: {e}")
+            time.sleep(1)
+            continue
+        user, job_id = job.get('user'), job.get('job_id')
+        logger.info(f"Worker: trabajo {job_id} user={user} carril={lane}")
+        future = scheduler.submit(
+            background_task_handler,
+            user=user,
+            job_class=lane,
+            data=job.get('data') or {},
+            sid=job.get('sid'),
+            job_id=job_id,
+        )
+        future.add_done_callback(lambda _, user=user, job_id=job_id: release_pipeline_job(user, job_id))
+
+
+if __name__ == "__main__":
+    if get_job_queue() is None:
+        logger.error("PIPELINE_JOB_QUEUE no configurada; el worker no tiene de dónde leer trabajos.")
+        sys.exit(1)
+    if not SOCKETIO_MESSAGE_QUEUE:
+        logger.error("SOCKETIO_MESSAGE_QUEUE no configurada; el worker no podría emitir a los clientes.")
+        sys.exit(1)
+    if not start_results_replication():
+        sys.exit(1)
+
+    # Los workers sí pagan el import de moviepy/yt_dlp/openai al arrancar, no en el primer trabajo
+    preload_pipeline_dependencies()
+    start_preingest_scheduler()
+    feeder_loop()